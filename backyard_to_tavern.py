@@ -6,20 +6,1258 @@
 import base64
 import zlib
 import json
-import re
 import os
 import sys
 import sqlite3
-from struct import pack, unpack
+import hashlib
+import tempfile
+import glob
+import threading
+import queue
+from struct import pack, unpack, unpack_from
 from pathlib import Path
 import time
 import argparse
+from datetime import datetime
+from collections import deque
+from heapq import heappush, heappop
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+SNAPSHOT_MODES = ('ro', 'immutable', 'memory', 'file')
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+COPY_BLOCK_SIZE = 1024 * 1024  # Buffer size when image data can't be copied in the kernel
+PNG_TAIL_BLOCK_SIZE = 64 * 1024  # Bytes read from the end of a PNG to find the chunks after its image data
+JSON_DECODER = json.JSONDecoder()
+MANIFEST_SAVE_INTERVAL = 50  # Batch results between manifest checkpoints
+DB_PAGE_SIZE = 500  # Batch rows read per query from a database the app may be writing to
+BATCH_CHUNK_SIZE = 8  # Batch entries handed to a worker process at a time
+INFLIGHT_BYTES = 64 * 1024 * 1024  # Default memory budget for batch entries between pipeline stages
+CACHE_BYTES = 64 * 1024 * 1024  # Default size cap of the extraction cache
+EXTRACTOR_HISTORY = 200  # Attempts per extractor carried over from earlier runs
+EXTRACTOR_PRIOR_SECONDS = 0.001  # Assumed cost of an extractor before it's been timed
+
+
+def image_basename(image_url):
+    """Return the file name part of an image path stored with either separator style"""
+    return image_url.replace('\\', '/').rsplit('/', 1)[-1]
+
+
+def _kernel_copy_functions():
+    """Yield in-kernel file copy functions taking (src_fd, dst_fd, offset, count)"""
+    if hasattr(os, 'copy_file_range'):
+        yield lambda src_fd, dst_fd, offset, count: os.copy_file_range(src_fd, dst_fd, count, offset)
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        # sendfile only accepts regular files as the destination on Linux
+        yield lambda src_fd, dst_fd, offset, count: os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def copy_file_bytes(src, dst, offset, count):
+    """Copy count bytes starting at offset from one open file to the end of another
+    
+    Uses os.copy_file_range or os.sendfile to copy inside the kernel where the
+    platform supports it, otherwise a fixed size buffer, so memory use does not
+    grow with the amount copied. dst must be flushed beforehand.
+    """
+    src_fd = src.fileno()
+    dst_fd = dst.fileno()
+    
+    for kernel_copy in _kernel_copy_functions():
+        try:
+            while count > 0:
+                copied = kernel_copy(src_fd, dst_fd, offset, count)
+                if copied == 0:
+                    break
+                offset += copied
+                count -= copied
+        except OSError:
+            # Not supported for these files (e.g. across filesystems), try the next way
+            continue
+        finally:
+            # The kernel moved the descriptor's position; resync the file object
+            dst.seek(0, os.SEEK_END)
+        return
+    
+    buffer = memoryview(bytearray(COPY_BLOCK_SIZE))
+    src.seek(offset)
+    while count > 0:
+        read = src.readinto(buffer[:min(count, COPY_BLOCK_SIZE)])
+        if not read:
+            break
+        dst.write(buffer[:read])
+        count -= read
+
+
+BASE64_ALPHABET = b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/='
+# Bytes that can't appear in a base64 payload, for bytes.translate(None, delete)
+_NON_BASE64_BYTES = bytes(sorted(set(range(256)) - set(BASE64_ALPHABET)))
+# Classifies every byte as base64 ('b'), terminating control 0x00-0x04 ('.') or other (' ')
+_PAYLOAD_CLASS_TABLE = bytes(ord('b') if i in BASE64_ALPHABET else ord('.') if i <= 4 else ord(' ')
+                             for i in range(256))
+
+
+def find_base64_payload(data, start=0, end=None, stop_at_control=False):
+    """Locate a base64 payload inside data[start:end] in linear time
+    
+    The payload starts at the first base64 character. With stop_at_control it
+    ends at the first low control byte (0x00-0x04) after that, as in EXIF
+    ASCII fields, otherwise at end. Returns (start, end) or None.
+    """
+    if end is None:
+        end = len(data)
+    classes = bytes(data[start:end]).translate(_PAYLOAD_CLASS_TABLE)
+    
+    first = classes.find(b'b')
+    if first == -1:
+        return None
+    
+    last = classes.find(b'.', first) if stop_at_control else -1
+    return start + first, start + last if last != -1 else end
+
+
+def clean_base64_payload(data, start=0, end=None):
+    """Strip non-base64 bytes from data[start:end] and fix its padding for decoding"""
+    if end is None:
+        end = len(data)
+    cleaned = bytes(data[start:end]).translate(None, _NON_BASE64_BYTES)
+    
+    # Fix padding
+    cleaned = cleaned.rstrip(b'=')  # Remove existing padding
+    padding = 4 - (len(cleaned) % 4)
+    if padding != 4:
+        cleaned += b'=' * padding
+    return cleaned
+
+
+class PngChunkIndex:
+    """Index of the chunks in a PNG, built in a single pass over the data
+
+    Each chunk is recorded as (type, offset, length, crc) where offset points at
+    the chunk's length field. Chunk payloads are never copied here; extractors
+    and the writer slice them out of the shared data on demand.
+
+    Indexes built with from_file() only hold the metadata chunks in memory, and
+    image data is read back from source_path when a PNG is written.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.view = memoryview(data)
+        self.chunks = []
+        self.tail = {}  # offset -> raw bytes of metadata chunks after the image data
+        self.source_path = None
+        self.is_png = data[:8] == PNG_SIGNATURE
+        if self.is_png:
+            self._build()
+    
+    @classmethod
+    def from_file(cls, path):
+        """Index a PNG on disk without reading its image data
+        
+        Chunks ahead of the first IDAT are read into memory. The image data is
+        recorded as one IDAT entry spanning every IDAT chunk, so the writer
+        copies it as a single range. Its end is found in the file's last block,
+        along with any chunks after it (where TavernAI cards may keep 'chara').
+        """
+        with open(path, 'rb', buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            header = bytearray(f.read(8))
+            index = cls(b'')
+            index.source_path = path
+            index.is_png = header == PNG_SIGNATURE
+            
+            pos = 8
+            while index.is_png and pos + 8 <= size:
+                head = f.read(8)
+                length, raw_type = unpack(">I4s", head)
+                chunk_type = raw_type.decode('ascii', errors='ignore')
+                
+                if pos + 8 + length > size:
+                    break
+                
+                if chunk_type == 'IDAT':
+                    index._index_image_data(f, pos, size)
+                    break
+                
+                body = f.read(length + 4)
+                crc = unpack_from(">I", body, length)[0] if len(body) == length + 4 else 0
+                header += head + body
+                index.chunks.append((chunk_type, pos, length, crc))
+                
+                pos += 12 + length
+                if chunk_type == 'IEND':
+                    break
+        
+        index.data = bytes(header)
+        index.view = memoryview(index.data)
+        return index
+    
+    def _index_image_data(self, f, start, size):
+        """Record the image data that starts with the IDAT chunk at start, and the chunks after it"""
+        block_start = max(start, size - PNG_TAIL_BLOCK_SIZE)
+        f.seek(block_start)
+        found = self._find_image_end(f.read(size - block_start), block_start, size)
+        if found is None:
+            # The last IDAT chunk starts ahead of the block (or the file is
+            # damaged), so step through the chunk headers instead
+            found = self._walk_image_data(f, start, size)
+        
+        end, trailing = found
+        if end is not None:
+            self.chunks.append(('IDAT', start, end - start - 12, 0))
+        for chunk, raw in trailing:
+            self.chunks.append(chunk)
+            self.tail[chunk[1]] = raw
+    
+    @staticmethod
+    def _find_image_end(block, block_start, size):
+        """Find the last IDAT chunk in a block read from the end of the file
+        
+        Returns (end of the image data, [(chunk, raw bytes)] for the chunks
+        after it), or None unless those chunks check out (CRCs included) and
+        end with IEND at the end of the file.
+        """
+        found = len(block)
+        while True:
+            found = block.rfind(b'IDAT', 4, found)
+            if found == -1:
+                return None
+            end = block_start + found + 8 + unpack_from(">I", block, found - 4)[0]
+            
+            trailing = []
+            pos = end
+            while pos + 12 <= size:
+                offset = pos - block_start
+                length, raw_type = unpack_from(">I4s", block, offset)
+                if raw_type == b'IDAT' or not raw_type.isalpha() or pos + 12 + length > size:
+                    break
+                raw = block[offset:offset + 12 + length]
+                crc = unpack_from(">I", raw, 8 + length)[0]
+                if zlib.crc32(raw[4:8 + length]) != crc:
+                    break
+                trailing.append(((raw_type.decode('ascii'), pos, length, crc), raw))
+                pos += 12 + length
+                if raw_type == b'IEND':
+                    if pos == size:
+                        return end, trailing
+                    break
+    
+    @staticmethod
+    def _walk_image_data(f, start, size):
+        """Step from the IDAT chunk at start through the rest of the file, like _find_image_end"""
+        end = None
+        trailing = []
+        pos = start
+        f.seek(pos)
+        head = f.read(8)
+        while len(head) == 8:
+            length, raw_type = unpack(">I4s", head)
+            if pos + 8 + length > size:
+                break
+            
+            if raw_type == b'IDAT':
+                # Skip the image data, reading its CRC and the next header in one go
+                f.seek(pos + 8 + length)
+                pos += 12 + length
+                end = pos
+                head = f.read(12)[4:]
+                continue
+            
+            body = f.read(length + 4)
+            crc = unpack_from(">I", body, length)[0] if len(body) == length + 4 else 0
+            trailing.append(((raw_type.decode('ascii', errors='ignore'), pos, length, crc), head + body))
+            pos += 12 + length
+            if raw_type == b'IEND':
+                break
+            head = f.read(8)
+        return end, trailing
+    
+    def _build(self):
+        data = self.data
+        size = len(data)
+        pos = 8  # Skip PNG signature
+        while pos + 8 <= size:
+            length, raw_type = unpack_from(">I4s", data, pos)
+            chunk_type = raw_type.decode('ascii', errors='ignore')
+            
+            if pos + 8 + length > size:
+                break
+            
+            crc = unpack_from(">I", data, pos + 8 + length)[0] if pos + 12 + length <= size else 0
+            self.chunks.append((chunk_type, pos, length, crc))
+            
+            pos += 12 + length
+            if chunk_type == 'IEND':
+                break
+    
+    def find(self, chunk_type):
+        """Yield every indexed chunk of the given type"""
+        for chunk in self.chunks:
+            if chunk[0] == chunk_type:
+                yield chunk
+    
+    def is_loaded(self, chunk):
+        """Whether a chunk's bytes are held in memory (image data may not be)"""
+        _, offset, length, _ = chunk
+        return offset + 8 + length <= len(self.data) or offset in self.tail
+    
+    def _locate(self, chunk):
+        """Return (buffer, start) holding the chunk's length field at buffer[start]"""
+        _, offset, length, _ = chunk
+        if offset + 8 + length <= len(self.data):
+            return self.data, offset
+        if offset in self.tail:
+            return self.tail[offset], 0
+        
+        # Image data that was skipped while indexing
+        with open(self.source_path, 'rb') as f:
+            f.seek(offset)
+            return f.read(8 + length), 0
+    
+    def chunk_bytes(self, chunk):
+        """Return a view of a chunk's length, type and payload fields (without the CRC)"""
+        buffer, start = self._locate(chunk)
+        return memoryview(buffer)[start:start + 8 + chunk[2]]
+    
+    def chunk_data(self, chunk):
+        """Return a zero-copy view of a chunk's payload"""
+        return self.chunk_bytes(chunk)[8:]
+    
+    def copy_range(self, dst, start, end):
+        """Write bytes [start, end) of the original PNG to an open file"""
+        if end <= len(self.data):
+            dst.write(self.view[start:end])
+            return
+        
+        with open(self.source_path, 'rb') as src:
+            dst.flush()
+            copy_file_bytes(src, dst, start, end - start)
+    
+    def find_in_chunk(self, chunk, sub):
+        """Find a byte string inside a chunk's payload, returning its offset in the payload or -1"""
+        if not self.is_loaded(chunk):
+            return -1
+        buffer, start = self._locate(chunk)
+        found = buffer.find(sub, start + 8, start + 8 + chunk[2])
+        return found - start - 8 if found != -1 else -1
+
+
+def sniff_card_format(index):
+    """Tell which card format a PNG holds from its chunk index alone
+    
+    Returns 'tavern' for a tEXt chunk with the 'chara' keyword, 'exif' for an
+    eXIf chunk holding an ASCII marker, 'backyard_export' for an ASCII marker
+    ahead of the image data, or None when none of these are present.
+    """
+    if not index.is_png:
+        return None
+    for chunk in index.find('tEXt'):
+        if index.find_in_chunk(chunk, b'chara\x00') == 0:
+            return 'tavern'
+    for chunk in index.find('eXIf'):
+        if index.find_in_chunk(chunk, b'ASCII') != -1:
+            return 'exif'
+    first_idat = next(index.find('IDAT'), None)
+    limit = first_idat[1] if first_idat else len(index.data)
+    if index.data.find(b'ASCII', 0, limit) != -1:
+        return 'backyard_export'
+    return None
+
+
+def sql_timestamp_ms(column):
+    """SQL expression for a DateTime column as epoch milliseconds
+    
+    Prisma stores DateTime values in SQLite as millisecond integers, but older
+    databases may hold ISO 8601 text.
+    """
+    return (f"(CASE typeof({column}) WHEN 'text' "
+            f"THEN CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER) "
+            f"ELSE {column} END)")
+
+
+def parse_since(value):
+    """argparse type for --since: 'auto', epoch milliseconds or an ISO 8601 date/time"""
+    if value == 'auto' or value.isdigit():
+        return value if value == 'auto' else int(value)
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected 'auto', epoch milliseconds or an ISO date, got {value!r}")
+    return int(moment.timestamp() * 1000)
+
+
+def format_timestamp(ms):
+    """Format epoch milliseconds for display"""
+    return datetime.fromtimestamp(ms / 1000).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def walk_png_files(directory):
+    """Yield the PNG files under a directory, recursively, in name order
+    
+    Cards this tool wrote (*.tavern.png) are left out so re-running on a
+    folder doesn't convert its own output. Symlinked directories aren't
+    followed, so a link loop can't recurse forever.
+    """
+    try:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError as e:
+        print(f"Warning: can't read directory {directory}: {str(e)}")
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_png_files(entry.path)
+        elif entry.is_file() and entry.name.lower().endswith('.png') \
+                and not entry.name.lower().endswith('.tavern.png'):
+            yield entry.path
+
+
+def is_glob_pattern(value):
+    """Whether an input is a glob pattern rather than a path (which may contain [ ] too)"""
+    return any(c in value for c in '*?[') and not os.path.exists(value)
+
+
+def expand_input_paths(inputs):
+    """Expand command line inputs (files, glob patterns, directories) into PNG paths
+    
+    Each file is listed once, in the order first given.
+    """
+    seen = set()
+    for value in inputs:
+        value = value.strip('"')
+        matches = sorted(glob.glob(value, recursive=True)) if is_glob_pattern(value) else [value]
+        for match in matches:
+            paths = walk_png_files(match) if os.path.isdir(match) else [match]
+            for path in paths:
+                key = os.path.abspath(path)
+                if key not in seen:
+                    seen.add(key)
+                    yield path
+
+
+def parse_limit(value):
+    """argparse type for --limit: a count of zero or more"""
+    if value.isdigit():
+        return int(value)
+    raise argparse.ArgumentTypeError(f"expected a number >= 0, got {value!r}")
+
+
+def parse_shard(value):
+    """argparse type for --shard: K/N with 1 <= K <= N"""
+    index, sep, count = value.partition('/')
+    if sep and index.isdigit() and count.isdigit() and 1 <= int(index) <= int(count):
+        return int(index), int(count)
+    raise argparse.ArgumentTypeError(f"expected K/N with 1 <= K <= N, got {value!r}")
+
+
+class ShardPlan:
+    """Assigns every CharacterConfigVersion to one of count shards
+    
+    By default a version's shard comes from a SHA-1 of its id, which every
+    machine computes the same way. With cost balancing, versions are instead
+    dealt out largest first to the shard with the least estimated work, which
+    only agrees across machines that have the same database and images.
+    Versions created after balancing (while watching) fall back to the hash.
+    """
+    
+    def __init__(self, index, count):
+        self.index = index  # 1-based
+        self.count = count
+        self.members = None  # Version ids in this shard, once cost balanced
+        self.balanced = None  # Version ids of every shard, once cost balanced
+    
+    @property
+    def label(self):
+        return f"{self.index}-of-{self.count}"
+    
+    def shard_of(self, version_id):
+        digest = hashlib.sha1(str(version_id).encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big') % self.count + 1
+    
+    def contains(self, version_id):
+        if self.members is not None and str(version_id) in self.balanced:
+            return str(version_id) in self.members
+        return self.shard_of(version_id) == self.index
+    
+    def balance(self, costs):
+        """Assign versions from (version_id, cost) pairs so each shard gets a similar total cost"""
+        loads = [(0, shard) for shard in range(1, self.count + 1)]
+        members = set()
+        balanced = set()
+        # Ties are broken by id and shard number so every machine deals the same way
+        for version_id, cost in sorted(costs, key=lambda item: (-item[1], str(item[0]))):
+            load, shard = heappop(loads)
+            balanced.add(str(version_id))
+            if shard == self.index:
+                members.add(str(version_id))
+            heappush(loads, (load + cost, shard))
+        self.members = members
+        self.balanced = balanced
+
+
+def like_pattern(pattern):
+    """Translate a * and ? wildcard pattern into a SQL LIKE pattern escaped with backslash"""
+    escaped = pattern.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped.replace('*', '%').replace('?', '_')
+
+
+def parse_path_map(value):
+    """argparse type for --path-map: OLD=NEW path prefixes"""
+    old, sep, new = value.partition('=')
+    if not sep or not old or not new:
+        raise argparse.ArgumentTypeError(f"expected OLD=NEW, got {value!r}")
+    return old, new
+
+
+class ImageDirectoryIndex:
+    """Resolves database image paths against directory listings read once
+    
+    Each directory an imageUrl points into is listed with os.scandir the first
+    time it's seen, and later lookups are set membership tests, so a batch
+    costs one listing per directory instead of a stat per character. Path maps
+    rewrite stored prefixes first, so a database copied from another machine
+    (or OS) resolves against local folders; either separator style is accepted.
+    """
+    
+    def __init__(self, path_maps=()):
+        self.path_maps = [(self._split(old), new) for old, new in path_maps]
+        self.listings = {}
+    
+    @staticmethod
+    def _split(path):
+        return [part for part in path.replace('\\', '/').split('/') if part]
+    
+    def remap(self, image_url):
+        """Apply the first matching path map, returning a path in local form"""
+        parts = self._split(image_url)
+        for old_parts, new in self.path_maps:
+            if parts[:len(old_parts)] == old_parts:
+                return os.path.join(new, *parts[len(old_parts):])
+        return os.path.normpath(image_url.replace('\\', os.sep))
+    
+    def listing(self, directory):
+        """The files in a directory by (case-normalized) name, read once"""
+        files = self.listings.get(directory)
+        if files is None:
+            files = {}
+            try:
+                with os.scandir(directory or '.') as entries:
+                    files = {os.path.normcase(entry.name): entry for entry in entries if entry.is_file()}
+            except OSError:
+                pass
+            self.listings[directory] = files
+        return files
+    
+    def resolve(self, image_url):
+        """Return the local path of a stored image, or None if the file isn't there"""
+        path = self.remap(image_url)
+        directory, name = os.path.split(path)
+        if os.path.normcase(name) in self.listing(directory):
+            return path
+        return None
+    
+    def size(self, image_url):
+        """Size in bytes of a stored image, or 0 if the file isn't there"""
+        directory, name = os.path.split(self.remap(image_url))
+        entry = self.listing(directory).get(os.path.normcase(name))
+        try:
+            return entry.stat().st_size if entry else 0
+        except OSError:
+            return 0
+
+
+class CharacterRow:
+    """A character version read from the BackyardAI database for a batch run"""
+    __slots__ = ('version_id', 'name', 'display_name', 'persona', 'greeting', 'custom_dialogue',
+                 'has_image', 'path', 'changed_at')
+    
+    def __init__(self, version_id, name='Unknown', display_name=None, persona=None, greeting=None,
+                 custom_dialogue=None, has_image=False, path=None, changed_at=None):
+        self.version_id = version_id
+        self.name = name
+        self.display_name = display_name
+        self.persona = persona
+        self.greeting = greeting
+        self.custom_dialogue = custom_dialogue
+        self.has_image = has_image
+        self.path = path
+        self.changed_at = changed_at
+
+
+class CharacterCard:
+    """Character data extracted for a card, in TavernAI field names
+    
+    Fields left as None are absent from the card. Keys of a source card that
+    have no field here (V2 'data', 'spec', ...) are kept in extra. A card
+    built by from_dict remembers the source's keys, so it's written back with
+    the same keys in the same order, explicit nulls included.
+    """
+    FIELDS = ('name', 'display_name', 'description', 'personality', 'scenario', 'first_mes', 'mes_example')
+    __slots__ = FIELDS + ('extra', 'keys')
+    
+    def __init__(self, name=None, display_name=None, description=None, personality=None, scenario=None,
+                 first_mes=None, mes_example=None, extra=None):
+        self.name = name
+        self.display_name = display_name
+        self.description = description
+        self.personality = personality
+        self.scenario = scenario
+        self.first_mes = first_mes
+        self.mes_example = mes_example
+        self.extra = extra
+        self.keys = None  # Key order of the source card, for cards read from one
+    
+    @classmethod
+    def from_dict(cls, data):
+        card = cls(**{key: data[key] for key in cls.FIELDS if key in data})
+        extra = {key: value for key, value in data.items() if key not in cls.FIELDS}
+        card.extra = extra or None
+        card.keys = tuple(data)
+        return card
+    
+    def to_dict(self, include_display_name=True):
+        """Build the JSON object written for this card"""
+        data = {}
+        extra = self.extra or {}
+        for key in self.keys or ():
+            if key in extra:
+                data[key] = extra[key]
+            elif key in self.FIELDS and (include_display_name or key != 'display_name'):
+                data[key] = getattr(self, key)
+        for key in self.FIELDS:
+            if key in data:
+                continue
+            value = getattr(self, key)
+            if value is not None and (include_display_name or key != 'display_name'):
+                data[key] = value
+        for key, value in extra.items():
+            data.setdefault(key, value)
+        return data
+
+
+def file_sha1(path):
+    """Hash a file's contents in fixed size blocks"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def character_data_hash(row):
+    """Hash the character fields a database row exports"""
+    fields = [row.name, row.display_name, row.persona, row.greeting, row.custom_dialogue]
+    return hashlib.sha1(json.dumps(fields).encode('utf-8')).hexdigest()
+
+
+def source_fingerprint(file_info):
+    """Describe the source of a batch entry so a later run can tell if it changed
+    
+    Database entries hash the character fields exported from the database, and
+    entries with an image also record the image's size, mtime and SHA-1.
+    """
+    fingerprint = {}
+    if isinstance(file_info, CharacterRow):
+        fingerprint['data'] = character_data_hash(file_info)
+        path = file_info.path if file_info.has_image else None
+    else:
+        path = file_info
+    
+    if path:
+        try:
+            st = os.stat(path)
+            fingerprint.update(size=st.st_size, mtime=st.st_mtime_ns, sha1=file_sha1(path))
+        except OSError:
+            pass
+    return fingerprint
+
+
+class FilenameRegistry:
+    """Hands out unique output file names within one directory
+    
+    The directory is listed once up front; after that each name costs a set
+    lookup, and a repeated name carries on from the last number handed out
+    rather than probing _1, _2, ... on disk again. A card's PNG and JSON share
+    a stem ("Name.tavern.png" and "Name.tavern.json"), and reserving either
+    takes both. Reservations are locked so threads can share a registry;
+    worker processes never pick names, they write to the paths planned here.
+    """
+    CARD_SUFFIXES = ('.tavern.png', '.tavern.json')
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self.taken = set()
+        self.next_number = {}
+        self.lock = threading.Lock()
+        try:
+            with os.scandir(directory or '.') as entries:
+                for entry in entries:
+                    self.taken.add(self._key(*self._split(entry.name)))
+        except OSError:
+            pass
+    
+    def _split(self, name):
+        lower = name.lower()
+        for suffix in self.CARD_SUFFIXES:
+            if lower.endswith(suffix):
+                return name[:-len(suffix)], name[-len(suffix):]
+        return os.path.splitext(name)
+    
+    def _key(self, stem, suffix):
+        if suffix.lower() in self.CARD_SUFFIXES:
+            return os.path.normcase(stem)
+        return os.path.normcase(stem + suffix)
+    
+    def add(self, path):
+        """Mark a path in this directory as taken"""
+        key = self._key(*self._split(os.path.basename(path)))
+        with self.lock:
+            self.taken.add(key)
+    
+    def reserve(self, filename):
+        """Return a path in the directory for filename, numbered if the name is taken"""
+        stem, suffix = self._split(filename)
+        with self.lock:
+            candidate = stem
+            if self._key(stem, suffix) in self.taken:
+                number = self.next_number.get(stem, 1)
+                while self._key(f"{stem}_{number}", suffix) in self.taken:
+                    number += 1
+                self.next_number[stem] = number + 1
+                candidate = f"{stem}_{number}"
+            self.taken.add(self._key(candidate, suffix))
+        return os.path.join(self.directory, candidate + suffix)
+
+
+class ConversionManifest:
+    """Record of what a batch run converted, kept in the output directory
+    
+    Entries are keyed by CharacterConfigVersion id (or absolute path for plain
+    files) and store the result, the source fingerprint and the output file
+    names, so re-runs can skip unchanged characters and overwrite their
+    previous outputs instead of creating numbered duplicates.
+    """
+    FILENAME = '.conversion_manifest.json'
+    SHARD_FILENAME = '.conversion_manifest.shard-{}.json'
+    VERSION = 1
+    
+    def __init__(self, output_dir, shard_label=None):
+        self.output_dir = output_dir
+        filename = self.SHARD_FILENAME.format(shard_label) if shard_label else self.FILENAME
+        self.path = os.path.join(output_dir, filename)
+        self.shard_label = shard_label
+        self.entries = {}
+        self.others = {}  # Entries of other shards' manifests, only to keep their names taken
+        self.watermarks = {}  # Filter scope -> newest version change time (epoch ms) fully converted
+        self.dirty = False
+        self._run_newest = None
+        self._run_oldest_failure = None
+    
+    @classmethod
+    def load(cls, output_dir, shard_label=None):
+        """Load the manifest for output_dir (or for one shard of it)
+        
+        Shards each keep their own manifest, so their entries never overlap.
+        A run without --shard merges all shard manifests found in the
+        directory into its own; a shard run only reads the others to keep the
+        output names they used.
+        """
+        manifest = cls(output_dir, shard_label)
+        data = manifest.read(manifest.path)
+        if data:
+            manifest.entries = data.get('entries', {})
+            manifest.watermarks = data.get('watermarks', {})
+            if data.get('watermark') is not None:
+                manifest.watermarks[''] = data['watermark']
+        
+        try:
+            names = sorted(name for name in os.listdir(output_dir)
+                           if name.startswith('.conversion_manifest') and name.endswith('.json'))
+        except OSError:
+            names = []
+        for name in names:
+            path = os.path.join(output_dir, name)
+            if path == manifest.path:
+                continue
+            data = manifest.read(path)
+            if not data:
+                continue
+            target = manifest.others if shard_label else manifest.entries
+            for key, entry in data.get('entries', {}).items():
+                target.setdefault(key, entry)
+        return manifest
+    
+    def read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                return data
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable manifest {path}: {str(e)}")
+        return None
+    
+    def save(self):
+        """Write the manifest atomically, so an interrupted run never leaves it half written"""
+        if not self.dirty:
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            scoped = {scope: value for scope, value in self.watermarks.items() if scope}
+            json.dump({'version': self.VERSION, 'watermark': self.watermarks.get(''), 'watermarks': scoped,
+                       'entries': self.entries}, f, indent=1)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+    
+    @staticmethod
+    def key_for(file_info):
+        if isinstance(file_info, CharacterRow):
+            return str(file_info.version_id)
+        return os.path.abspath(file_info)
+    
+    def output_paths(self):
+        """Every output path recorded in the manifest (and other shards' manifests)"""
+        for entries in (self.entries, self.others):
+            for entry in entries.values():
+                for name in entry.get('outputs', []):
+                    yield os.path.join(self.output_dir, name)
+    
+    def previous_output(self, key, extension):
+        """The primary output path a previous run used for this entry, if it had the same type"""
+        outputs = (self.entries.get(key) or self.others.get(key, {})).get('outputs', [])
+        if outputs and outputs[0].endswith(extension):
+            return os.path.join(self.output_dir, outputs[0])
+        return None
+    
+    def is_failed(self, key):
+        return self.entries.get(key, {}).get('status') == 'failed'
+    
+    def is_unchanged(self, key, file_info):
+        """Whether an entry converted successfully before and its source hasn't changed since"""
+        entry = self.entries.get(key)
+        if not entry or entry.get('status') != 'success':
+            return False
+        if not all(os.path.exists(path) for path in (os.path.join(self.output_dir, name)
+                                                      for name in entry.get('outputs', []))):
+            return False
+        
+        previous = entry.get('source', {})
+        if isinstance(file_info, CharacterRow):
+            if character_data_hash(file_info) != previous.get('data'):
+                return False
+            path = file_info.path if file_info.has_image else None
+        else:
+            path = file_info
+        
+        if not path:
+            return 'sha1' not in previous
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_size != previous.get('size'):
+            return False
+        if st.st_mtime_ns == previous.get('mtime'):
+            return True
+        
+        # Touched but possibly not modified: compare contents and remember the new mtime
+        if file_sha1(path) != previous.get('sha1'):
+            return False
+        previous['mtime'] = st.st_mtime_ns
+        self.dirty = True
+        return True
+    
+    @staticmethod
+    def watermark_scope(filters):
+        """Key of the watermark for runs with these database filters, or None if they can't have one
+        
+        A watermark means every matching version changed up to then has been
+        converted, so each filter set keeps its own ('' for no filters). A run
+        cut short by a limit doesn't convert every matching version.
+        """
+        if filters.get('limit') is not None:
+            return None
+        scope = {name: sorted(value) if isinstance(value, list) else value
+                 for name, value in filters.items() if name != 'since' and value}
+        return json.dumps(scope, sort_keys=True) if scope else ''
+    
+    def start_run(self):
+        """Forget the change times noted by a previous run on this manifest"""
+        self._run_newest = None
+        self._run_oldest_failure = None
+    
+    def track_change_time(self, changed_at, success):
+        """Note the change time of a database entry handled in this run"""
+        if changed_at is None:
+            return
+        if self._run_newest is None or changed_at > self._run_newest:
+            self._run_newest = changed_at
+        if not success and (self._run_oldest_failure is None or changed_at < self._run_oldest_failure):
+            self._run_oldest_failure = changed_at
+    
+    def advance_watermark(self, scope=''):
+        """Move the watermark of a filter scope up after a completed run
+        
+        It stays put if anything failed, so the next --since auto run picks the
+        failure up again. Entries that succeeded are skipped as unchanged then.
+        """
+        if self._run_oldest_failure is not None:
+            return
+        newest = self._run_newest
+        watermark = self.watermarks.get(scope)
+        if newest is not None and (watermark is None or newest > watermark):
+            self.watermarks[scope] = newest
+            self.dirty = True
+    
+    def record(self, key, success, fingerprint, output_paths):
+        self.entries[key] = {
+            'status': 'success' if success else 'failed',
+            'source': fingerprint,
+            'outputs': [os.path.relpath(path, self.output_dir) for path in output_paths if path],
+        }
+        self.dirty = True
+
+
+class Extractor:
+    """One way of reading a card out of a PNG, with its record so far"""
+    __slots__ = ('card_format', 'name', 'extract', 'hits', 'attempts', 'seconds', 'saved')
+    
+    def __init__(self, card_format, name, extract):
+        self.card_format = card_format  # Tag given by sniff_card_format
+        self.name = name
+        self.extract = extract
+        self.hits = 0
+        self.attempts = 0
+        self.seconds = 0.0
+        self.saved = (0, 0, 0.0)  # Counts already written to the cache
+    
+    def score(self):
+        """Chance of a hit per second spent, with both smoothed toward a prior"""
+        hit_rate = (self.hits + 1) / (self.attempts + 2)
+        mean_cost = (self.seconds + EXTRACTOR_PRIOR_SECONDS) / (self.attempts + 1)
+        return hit_rate / mean_cost
+
+
+class ExtractorRegistry:
+    """The PNG extractors, tried in the order most likely to find a card soonest
+    
+    Trying extractors by falling hit rate over mean cost minimises the
+    expected time to a hit, so a library of mostly EXIF cards moves the EXIF
+    extractor to the front. Until there's data the default order is kept.
+    Counts from earlier runs are scaled down to EXTRACTOR_HISTORY attempts,
+    so the library being converted now soon outweighs them.
+    """
+    
+    def __init__(self, extractors):
+        self.extractors = [Extractor(*extractor) for extractor in extractors]
+    
+    def ordered(self):
+        return sorted(self.extractors, key=Extractor.score, reverse=True)
+    
+    def extract(self, png_index, log=None, card_format=None, exclude=None):
+        """Return (CharacterCard, method name) from the first extractor that finds one, or (None, None)
+        
+        card_format limits this to the one extractor for that format, and
+        exclude leaves one out.
+        """
+        for extractor in self.ordered():
+            if card_format and extractor.card_format != card_format:
+                continue
+            if exclude and extractor.card_format == exclude:
+                continue
+            if log:
+                log(f"Trying {extractor.name} extraction...")
+            start = time.perf_counter()
+            card = extractor.extract(png_index)
+            extractor.seconds += time.perf_counter() - start
+            extractor.attempts += 1
+            if card:
+                extractor.hits += 1
+                return card, extractor.name
+        return None, None
+    
+    def load(self, counts):
+        """Start from counts saved by earlier runs, {name: (hits, attempts, seconds)}"""
+        for extractor in self.extractors:
+            if extractor.name not in counts:
+                continue
+            hits, attempts, seconds = counts[extractor.name]
+            scale = min(1.0, EXTRACTOR_HISTORY / attempts) if attempts else 1.0
+            extractor.hits += hits * scale
+            extractor.attempts += attempts * scale
+            extractor.seconds += seconds * scale
+            extractor.saved = (extractor.hits, extractor.attempts, extractor.seconds)
+    
+    def unsaved(self):
+        """Return and mark saved what was counted since the last call, {name: (hits, attempts, seconds)}"""
+        counts = {}
+        for extractor in self.extractors:
+            current = (extractor.hits, extractor.attempts, extractor.seconds)
+            if current[1] != extractor.saved[1]:
+                counts[extractor.name] = tuple(now - before for now, before in zip(current, extractor.saved))
+                extractor.saved = current
+        return counts
+
+
+def default_cache_path():
+    """Location of the extraction cache shared by all runs of this user"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'backyard_to_tavern', 'extraction_cache.sqlite')
+
+
+class ExtractionCache:
+    """On-disk cache of cards extracted from PNG files
+    
+    An entry is found by (path, size, mtime) without reading anything else,
+    and otherwise by a hash of the file's metadata chunks, which are the only
+    bytes the extractors look at; a copied or touched file still hits. Cards
+    taken from the database are not cached since they follow the database.
+    Least recently used entries are evicted once the cache outgrows max_bytes.
+    The cache also keeps the extractors' hit and cost counts between runs.
+    
+    The cache is best effort: any SQLite error only turns into a miss.
+    """
+    VERSION = 2
+    
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = None
+        self.touched = set()
+    
+    @classmethod
+    def open(cls, path, max_bytes):
+        cache = cls(path, max_bytes)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != cls.VERSION:
+            conn.executescript(f"""
+                DROP TABLE IF EXISTS cards;
+                DROP TABLE IF EXISTS extractors;
+                CREATE TABLE cards (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    card TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    last_used INTEGER NOT NULL
+                );
+                CREATE INDEX cards_content ON cards (content_hash);
+                CREATE INDEX cards_last_used ON cards (last_used);
+                CREATE TABLE extractors (
+                    name TEXT PRIMARY KEY,
+                    hits REAL NOT NULL,
+                    attempts REAL NOT NULL,
+                    seconds REAL NOT NULL
+                );
+                PRAGMA user_version = {cls.VERSION};
+            """)
+        cache.conn = conn
+        return cache
+    
+    @staticmethod
+    def content_hash(png_index):
+        """Hash of the metadata chunks an extractor can see"""
+        digest = hashlib.sha1(png_index.data)
+        for offset in sorted(png_index.tail):
+            digest.update(png_index.tail[offset])
+        return digest.hexdigest()
+    
+    @staticmethod
+    def file_key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+    
+    def get(self, path, png_index):
+        """Return the cached (CharacterCard, method) for a file, or None"""
+        try:
+            key, size, mtime_ns = self.file_key(path)
+            row = self.conn.execute(
+                "SELECT card, method FROM cards WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (key, size, mtime_ns)).fetchone()
+            if row:
+                self.touched.add(key)
+            else:
+                content_hash = self.content_hash(png_index)
+                row = self.conn.execute(
+                    "SELECT card, method FROM cards WHERE content_hash = ? LIMIT 1",
+                    (content_hash,)).fetchone()
+                if not row:
+                    return None
+                self.store(key, size, mtime_ns, content_hash, row[0], row[1])
+        except (OSError, sqlite3.Error):
+            return None
+        return CharacterCard.from_dict(json.loads(row[0])), row[1]
+    
+    def put(self, path, png_index, card, method):
+        try:
+            key, size, mtime_ns = self.file_key(path)
+            self.store(key, size, mtime_ns, self.content_hash(png_index),
+                       json.dumps(card.to_dict(), ensure_ascii=False), method)
+        except (OSError, sqlite3.Error):
+            pass
+    
+    def store(self, key, size, mtime_ns, content_hash, card_json, method):
+        now = time.time_ns()
+        with self.conn:
+            self.flush_touched(now)
+            self.conn.execute("INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (key, size, mtime_ns, content_hash, card_json, method, now))
+    
+    def flush_touched(self, now):
+        """Write the use times of entries hit since the last write"""
+        if self.touched:
+            self.conn.executemany("UPDATE cards SET last_used = ? WHERE path = ?",
+                                  [(now, key) for key in self.touched])
+            self.touched.clear()
+    
+    def extractor_counts(self):
+        """Return the saved extractor counts, {name: (hits, attempts, seconds)}"""
+        try:
+            rows = self.conn.execute("SELECT name, hits, attempts, seconds FROM extractors").fetchall()
+        except sqlite3.Error:
+            return {}
+        return {name: (hits, attempts, seconds) for name, hits, attempts, seconds in rows}
+    
+    def add_extractor_counts(self, counts):
+        """Add counts from this process to the saved ones; other processes may be adding too"""
+        if not counts:
+            return
+        try:
+            with self.conn:
+                for name, (hits, attempts, seconds) in counts.items():
+                    self.conn.execute("""
+                        INSERT INTO extractors VALUES (?, ?, ?, ?)
+                        ON CONFLICT (name) DO UPDATE SET hits = hits + excluded.hits,
+                            attempts = attempts + excluded.attempts, seconds = seconds + excluded.seconds
+                    """, (name, hits, attempts, seconds))
+        except sqlite3.Error:
+            pass
+    
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(card) + LENGTH(path) + 100), 0) FROM cards").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        stale = []
+        for key, entry_bytes in self.conn.execute(
+                "SELECT path, LENGTH(card) + LENGTH(path) + 100 FROM cards ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= entry_bytes
+        with self.conn:
+            self.conn.executemany("DELETE FROM cards WHERE path = ?", stale)
+        return len(stale)
+    
+    def flush(self):
+        try:
+            with self.conn:
+                self.flush_touched(time.time_ns())
+        except sqlite3.Error:
+            pass
+    
+    def close(self, evict=True):
+        if not self.conn:
+            return
+        self.flush()
+        if evict:
+            try:
+                self.evict()
+            except sqlite3.Error:
+                pass
+        self.conn.close()
+        self.conn = None
+
+
+class ByteBudget:
+    """Caps how many bytes of batch entries are held between pipeline stages
+    
+    acquire blocks while the budget is used up, except when nothing is in
+    flight, so an entry larger than the whole budget still gets through.
+    """
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.condition = threading.Condition()
+    
+    def acquire(self, size):
+        with self.condition:
+            while self.in_flight and self.in_flight + size > self.limit:
+                self.condition.wait()
+            self.in_flight += size
+    
+    def resize(self, old_size, new_size):
+        """Change the bytes counted for an entry already in flight, without waiting"""
+        with self.condition:
+            self.in_flight += new_size - old_size
+            if new_size < old_size:
+                self.condition.notify_all()
+    
+    def release(self, size):
+        with self.condition:
+            self.in_flight -= size
+            self.condition.notify_all()
+
+
+class PipelineItem:
+    """A batch entry on its way through convert_batch_pipeline"""
+    __slots__ = ('sequence', 'position', 'task', 'source', 'index', 'rendered', 'json_text',
+                 'fingerprint', 'size', 'error')
+    
+    def __init__(self, sequence, position, task):
+        file_info = task[0]
+        self.sequence = sequence
+        self.position = position
+        self.task = task
+        # The PNG to read, if any: database rows without an image are built from the row
+        if isinstance(file_info, CharacterRow):
+            self.source = file_info.path if file_info.has_image else None
+        else:
+            self.source = file_info
+        self.index = None
+        self.rendered = None
+        self.json_text = None
+        self.fingerprint = None
+        self.size = 0
+        self.error = None
+
 
 class BackyardToTavernConverter:
     def __init__(self, debug=False, verbose=False):
         self.debug = debug
         self.verbose = verbose
-        self.stats = {
+        self.stats = self.new_stats()
+        self.db_path = None
+        self.db_snapshot = None
+        self.db_snapshot_path = None
+        self.db_conn = None
+        self.db_cursor = None
+        self.image_lookup = None
+        self.db_read_failed = False  # Set when a batch query stops partway, so the batch is incomplete
+        self.path_maps = []  # (stored prefix, local prefix) pairs for image paths
+        self.cache = None  # ExtractionCache for cards read from PNG files
+        self.extractors = ExtractorRegistry([
+            ('tavern', "TavernAI format", self.extract_tavern_format),                # Common for imports
+            ('backyard_export', "BackyardAI export", self.extract_backyard_export),   # Exported files
+            ('exif', "EXIF format", self.extract_exif_format),                        # Alternate BackyardAI exports
+        ])
+        self.failed_files = []
+    
+    def new_stats(self):
+        """Return a fresh set of conversion counters"""
+        return {
             'total': 0,
             'success': 0,
             'failed': 0,
@@ -29,11 +1267,12 @@ class BackyardToTavernConverter:
             'backyard_export': 0,
             'exif_format': 0,
             'json_only': 0,
-            'png_files': 0
+            'png_files': 0,
+            'skipped': 0,
+            'cache_hits': 0,
+            'unrecognized_format': 0,
+            'format_misread': 0
         }
-        self.db_conn = None
-        self.db_cursor = None
-        self.failed_files = []
     
     def debug_print(self, msg):
         if self.debug:
@@ -52,8 +1291,19 @@ class BackyardToTavernConverter:
         else:  # Linux and others
             return os.path.expanduser('~/.local/share/faraday/db.sqlite')
     
-    def open_database(self, db_path=None):
-        """Open connection to the BackyardAI database"""
+    def open_database(self, db_path=None, snapshot=None):
+        """Open connection to the BackyardAI database
+        
+        snapshot picks how the live database is read, so a long export neither
+        blocks the running app nor sees data change part-way through:
+        
+        - 'ro': read-only connection; never takes write locks
+        - 'immutable': read-only without any locking (only safe while the app is closed)
+        - 'memory': copy into an in-memory database with the backup API
+        - 'file': copy into a temporary file with the backup API
+        
+        With no snapshot the database is opened normally.
+        """
         if db_path is None:
             db_path = self.get_default_db_path()
         
@@ -62,13 +1312,96 @@ class BackyardToTavernConverter:
             return False
         
         try:
-            self.db_conn = sqlite3.connect(db_path)
+            self.db_conn = self.connect_database(db_path, snapshot)
             self.db_cursor = self.db_conn.cursor()
-            self.verbose_print(f"Connected to database: {db_path}")
+            self.db_path = db_path
+            self.db_snapshot = snapshot
+            self.verbose_print(f"Connected to database: {db_path}" +
+                               (f" ({snapshot} snapshot)" if snapshot else ""))
             return True
         except Exception as e:
             print(f"Error opening database: {str(e)}")
+            self.remove_snapshot_file()
+            return False
+    
+    def connect_database(self, db_path, snapshot=None):
+        """Return a connection to db_path opened in the given snapshot mode"""
+        if snapshot is None:
+            return sqlite3.connect(db_path)
+        
+        uri = Path(db_path).absolute().as_uri() + '?mode=ro'
+        if snapshot == 'immutable':
+            uri += '&immutable=1'
+        source = sqlite3.connect(uri, uri=True)
+        if snapshot in ('ro', 'immutable'):
+            return source
+        
+        if snapshot == 'memory':
+            target = sqlite3.connect(':memory:')
+        else:
+            fd, self.db_snapshot_path = tempfile.mkstemp(prefix='backyard_snapshot_', suffix='.sqlite')
+            os.close(fd)
+            target = sqlite3.connect(self.db_snapshot_path)
+        try:
+            # Copies every page in one step, under a single read transaction
+            source.backup(target)
+        finally:
+            source.close()
+        self.debug_print(f"Copied database snapshot to {self.db_snapshot_path or 'memory'}")
+        return target
+    
+    def worker_database(self):
+        """The (path, snapshot mode) batch worker processes should open
+        
+        Workers share a file snapshot, reading it without locks since nothing
+        writes to it. An in-memory snapshot can't be shared, so with 'memory'
+        it's written out to a temporary file first; the workers then see the
+        same copy as this process rather than the live database.
+        """
+        if self.db_snapshot == 'memory' and not self.db_snapshot_path:
+            fd, self.db_snapshot_path = tempfile.mkstemp(prefix='backyard_snapshot_', suffix='.sqlite')
+            os.close(fd)
+            target = sqlite3.connect(self.db_snapshot_path)
+            try:
+                self.db_conn.backup(target)
+            finally:
+                target.close()
+            self.debug_print(f"Copied in-memory snapshot to {self.db_snapshot_path} for worker processes")
+        if self.db_snapshot_path:
+            return self.db_snapshot_path, 'immutable'
+        return self.db_path, self.db_snapshot
+    
+    def remove_snapshot_file(self):
+        if self.db_snapshot_path:
+            try:
+                os.remove(self.db_snapshot_path)
+            except OSError:
+                pass
+            self.db_snapshot_path = None
+    
+    def open_cache(self, path=None, max_bytes=CACHE_BYTES):
+        """Open the extraction cache, returning False (and running without it) if that fails"""
+        path = path or default_cache_path()
+        try:
+            self.cache = ExtractionCache.open(path, max_bytes)
+        except (OSError, sqlite3.Error) as e:
+            self.verbose_print(f"Extraction cache unavailable ({path}): {e}")
             return False
+        self.debug_print(f"Using extraction cache: {path}")
+        self.extractors.load(self.cache.extractor_counts())
+        return True
+    
+    def flush_cache(self):
+        """Write out cache use and extractor counts gathered so far"""
+        if self.cache:
+            self.cache.add_extractor_counts(self.extractors.unsaved())
+            self.cache.flush()
+    
+    def close_cache(self, evict=True):
+        if self.cache:
+            self.cache.add_extractor_counts(self.extractors.unsaved())
+            self.cache.close(evict)
+            self.cache = None
     
     def close_database(self):
         """Close database connection"""
@@ -76,6 +1409,27 @@ class BackyardToTavernConverter:
             self.db_conn.close()
             self.db_conn = None
             self.db_cursor = None
+            self.image_lookup = None
+        self.remove_snapshot_file()
+    
+    def load_image_lookup(self):
+        """Map every AppImage file name to its newest CharacterConfigVersion id in one pass"""
+        self.db_cursor.execute("""
+            SELECT ai.imageUrl, ccv.id
+            FROM AppImage ai
+            JOIN _AppImageToCharacterConfigVersion aitc ON ai.id = aitc.A
+            JOIN CharacterConfigVersion ccv ON aitc.B = ccv.id
+            WHERE ai.imageUrl IS NOT NULL
+            ORDER BY ccv.createdAt DESC
+        """)
+        
+        lookup = {}
+        for image_url, version_id in self.db_cursor.fetchall():
+            # Newest version wins, matching the old per-file query's ordering
+            lookup.setdefault(image_basename(image_url).lower(), version_id)
+        
+        self.debug_print(f"Indexed {len(lookup)} database images")
+        return lookup
     
     def get_character_data_from_db(self, image_path):
         """Extract character data directly from database for a given image"""
@@ -86,7 +1440,16 @@ class BackyardToTavernConverter:
             # Get just the filename for matching
             filename = os.path.basename(image_path)
             
-            # Query to get character data from the image filename
+            # Resolve the filename through the lookup built on first use, so each
+            # file costs a dictionary hit instead of a full AppImage scan
+            if self.image_lookup is None:
+                self.image_lookup = self.load_image_lookup()
+            
+            version_id = self.image_lookup.get(filename.lower())
+            if version_id is None:
+                return None
+            
+            # Query to get character data for the matched version
             query = """
             SELECT 
                 ccv.id,
@@ -97,19 +1460,17 @@ class BackyardToTavernConverter:
                 gc.name as group_name,
                 c.greetingDialogue,
                 c.customDialogue
-            FROM AppImage ai
-            JOIN _AppImageToCharacterConfigVersion aitc ON ai.id = aitc.A
-            JOIN CharacterConfigVersion ccv ON aitc.B = ccv.id
+            FROM CharacterConfigVersion ccv
             LEFT JOIN CharacterConfig cc ON ccv.characterConfigId = cc.id
             LEFT JOIN _CharacterConfigToGroupConfig ccgc ON cc.id = ccgc.A
             LEFT JOIN GroupConfig gc ON ccgc.B = gc.id
             LEFT JOIN Chat c ON gc.id = c.groupConfigId
-            WHERE ai.imageUrl LIKE ?
-            ORDER BY ccv.createdAt DESC, c.createdAt DESC
+            WHERE ccv.id = ?
+            ORDER BY c.createdAt DESC
             LIMIT 1
             """
             
-            self.db_cursor.execute(query, (f"%{filename}",))
+            self.db_cursor.execute(query, (version_id,))
             result = self.db_cursor.fetchone()
             
             if result:
@@ -120,15 +1481,15 @@ class BackyardToTavernConverter:
                  char_config_id, group_name, greeting, custom_dialogue) = result
                 
                 # Build character data
-                char_data = {
-                    'name': name or display_name or 'Unknown',
-                    'display_name': display_name or name,
-                    'description': persona or '',
-                    'personality': '',
-                    'scenario': '',
-                    'first_mes': greeting or '',
-                    'mes_example': custom_dialogue or '',
-                }
+                char_data = CharacterCard(
+                    name=name or display_name or 'Unknown',
+                    display_name=display_name or name,
+                    description=persona or '',
+                    personality='',
+                    scenario='',
+                    first_mes=greeting or '',
+                    mes_example=custom_dialogue or '',
+                )
                 
                 # Parse persona field if it contains structured data
                 if persona:
@@ -151,178 +1512,154 @@ class BackyardToTavernConverter:
             for line in lines:
                 line_lower = line.lower().strip()
                 if any(keyword in line_lower for keyword in ['personality:', 'traits:', 'character:']):
-                    if not char_data['personality']:
-                        char_data['personality'] = line.strip()
+                    if not char_data.personality:
+                        char_data.personality = line.strip()
                 elif any(keyword in line_lower for keyword in ['scenario:', 'setting:', 'context:']):
-                    if not char_data['scenario']:
-                        char_data['scenario'] = line.strip()
+                    if not char_data.scenario:
+                        char_data.scenario = line.strip()
         
         # If no structured data found, use entire persona as description
-        if not char_data['personality'] and not char_data['scenario']:
-            char_data['description'] = persona
+        if not char_data.personality and not char_data.scenario:
+            char_data.description = persona
         
         return char_data
     
-    def extract_tavern_format(self, png_data):
+    def get_chunk_index(self, png):
+        """Return a PngChunkIndex for raw PNG bytes, reusing an existing index"""
+        if isinstance(png, PngChunkIndex):
+            return png
+        return PngChunkIndex(png)
+    
+    def extract_tavern_format(self, png):
         """Extract character data from TavernAI format PNG (Method 1)"""
         try:
-            if not png_data.startswith(b'\x89PNG'):
+            index = self.get_chunk_index(png)
+            if not index.is_png:
                 return None
             
-            pos = 8  # Skip PNG signature
-            while pos < len(png_data):
-                if pos + 8 > len(png_data):
-                    break
-                    
-                length = unpack(">I", png_data[pos:pos + 4])[0]
-                chunk_type = png_data[pos + 4:pos + 8].decode('ascii', errors='ignore')
+            for chunk in index.find('tEXt'):
+                separator = index.find_in_chunk(chunk, b'\x00')
+                if separator == -1:
+                    continue
                 
-                if pos + 8 + length > len(png_data):
-                    break
-                    
-                chunk_data = png_data[pos + 8:pos + 8 + length]
-                
-                if chunk_type == 'tEXt':
-                    keyword, text = chunk_data.split(b'\x00', 1)
-                    if keyword == b'chara':
-                        decoded = base64.b64decode(text).decode('utf-8')
-                        self.stats['tavern_format'] += 1
-                        self.debug_print("Found TavernAI format character data")
-                        return json.loads(decoded)
-                
-                pos += 12 + length
-                if chunk_type == 'IEND':
-                    break
+                chunk_data = index.chunk_data(chunk)
+                if chunk_data[:separator] == b'chara':
+                    decoded = base64.b64decode(chunk_data[separator + 1:]).decode('utf-8')
+                    self.stats['tavern_format'] += 1
+                    self.debug_print("Found TavernAI format character data")
+                    card = json.loads(decoded)
+                    return CharacterCard.from_dict(card) if card else None
                     
         except Exception as e:
             self.debug_print(f"TavernAI extraction failed: {e}")
         
         return None
 
-    def extract_exif_format(self, png_data):
+    def extract_exif_format(self, png):
         """Extract character data from EXIF metadata format (Method 3)"""
         try:
-            if not png_data.startswith(b'\x89PNG'):
+            index = self.get_chunk_index(png)
+            if not index.is_png:
                 return None
             
-            pos = 8  # Skip PNG signature
-            while pos < len(png_data):
-                if pos + 8 > len(png_data):
-                    break
-                
-                length = unpack(">I", png_data[pos:pos + 4])[0]
-                chunk_type = png_data[pos + 4:pos + 8].decode('ascii', errors='ignore')
-                
-                if pos + 8 + length > len(png_data):
-                    break
+            # Look for eXIf chunk
+            for chunk in index.find('eXIf'):
+                chunk_data = index.chunk_data(chunk)
+                self.debug_print("Found eXIf chunk")
                 
-                chunk_data = png_data[pos + 8:pos + 8 + length]
+                # Look for ASCII marker in EXIF data
+                ascii_marker = b'ASCII'
+                ascii_index = index.find_in_chunk(chunk, ascii_marker)
                 
-                # Look for eXIf chunk
-                if chunk_type == 'eXIf':
-                    self.debug_print("Found eXIf chunk")
+                if ascii_index != -1:
+                    # Extract base64 data after ASCII marker, up to the first low
+                    # control character that follows it
+                    bounds = find_base64_payload(chunk_data, ascii_index + len(ascii_marker),
+                                                 stop_at_control=True)
                     
-                    # Look for ASCII marker in EXIF data
-                    ascii_marker = b'ASCII'
-                    ascii_index = chunk_data.find(ascii_marker)
-                    
-                    if ascii_index != -1:
-                        # Extract base64 data after ASCII marker
-                        # Look for the end of the base64 data (usually ends with })
-                        start_pos = ascii_index + len(ascii_marker)
-                        
-                        # Skip any whitespace/control characters
-                        while start_pos < len(chunk_data) and chunk_data[start_pos:start_pos+1] in b' \x00\n\r\t':
-                            start_pos += 1
-                        
-                        base64_data = chunk_data[start_pos:]
-                        
-                        # Clean base64 data - remove non-base64 characters
-                        cleaned = b''
-                        for byte in base64_data:
-                            if chr(byte) in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=':
-                                cleaned += bytes([byte])
-                            elif cleaned and cleaned[-1:] != b'=' and byte in (0, 1, 2, 3, 4):
-                                # Stop at low control characters after we have data
-                                break
-                        
-                        if cleaned:
-                            try:
-                                # Fix padding if needed
-                                cleaned = cleaned.rstrip(b'=')
-                                padding = 4 - (len(cleaned) % 4)
-                                if padding != 4:
-                                    cleaned += b'=' * padding
-                                
-                                decoded = base64.b64decode(cleaned)
-                                text = decoded.decode('utf-8', errors='ignore')
-                                
-                                # Parse JSON
-                                json_match = re.search(r'(\{.*\})', text, re.DOTALL)
-                                if json_match:
-                                    json_str = json_match.group(1)
-                                    json_data = json.loads(json_str)
-                                    self.stats['exif_format'] = self.stats.get('exif_format', 0) + 1
-                                    self.debug_print("Found character data in EXIF format")
-                                    return self.parse_backyard_format(json_data)
-                            except Exception as e:
-                                self.debug_print(f"Error decoding EXIF base64: {e}")
-                    
-                pos += 12 + length
-                if chunk_type == 'IEND':
-                    break
+                    if bounds:
+                        try:
+                            cleaned = clean_base64_payload(chunk_data, *bounds)
+                            
+                            decoded = base64.b64decode(cleaned)
+                            text = decoded.decode('utf-8', errors='ignore')
+                            
+                            # Parse JSON
+                            json_data = self.parse_json_payload(text, "EXIF")
+                            if json_data is not None:
+                                self.stats['exif_format'] = self.stats.get('exif_format', 0) + 1
+                                self.debug_print("Found character data in EXIF format")
+                                return self.parse_backyard_format(json_data)
+                        except Exception as e:
+                            self.debug_print(f"Error decoding EXIF base64: {e}")
         
         except Exception as e:
             self.debug_print(f"EXIF extraction failed: {e}")
         
         return None
     
-    def extract_backyard_export(self, png_data):
+    def extract_backyard_export(self, png):
         """Extract character data from BackyardAI export format (simplified Method 2)"""
         try:
+            index = self.get_chunk_index(png)
+            png_data = index.data
             start_marker = b'ASCII'
             end_marker = b'IDATx'
             
-            start_index = png_data.find(start_marker)
+            # The payload sits ahead of the image data, which starts at the first
+            # IDAT chunk's type field ('IDAT' followed by the zlib header byte 'x')
+            first_idat = next(index.find('IDAT'), None)
+            limit = first_idat[1] + 4 if first_idat else len(png_data)
+            
+            start_index = png_data.find(start_marker, 0, limit)
             if start_index == -1:
                 return None
-                
-            end_index = png_data.find(end_marker, start_index + len(start_marker))
+            
+            if first_idat:
+                end_index = limit
+            else:
+                end_index = png_data.find(end_marker, start_index + len(start_marker))
             if end_index == -1:
                 return None
             
-            # Extract base64 data between markers
-            base64_data = png_data[start_index + len(start_marker):end_index]
-            
-            # Clean and decode
-            cleaned = re.sub(rb'[^a-zA-Z0-9+/=]', b'', base64_data)
-            
-            # Fix padding
-            cleaned = cleaned.rstrip(b'=')  # Remove existing padding
-            padding = 4 - (len(cleaned) % 4)
-            if padding != 4:
-                cleaned += b'=' * padding
+            # Extract and clean the base64 data between markers
+            cleaned = clean_base64_payload(png_data, start_index + len(start_marker), end_index)
             
             try:
                 decoded = base64.b64decode(cleaned)
                 text = decoded.decode('utf-8', errors='ignore')
                 
                 # Extract JSON
-                json_match = re.search(r'(\{.*\})', text, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(1)
-                    json_data = json.loads(json_str)
+                json_data = self.parse_json_payload(text, "BackyardAI export")
+                if json_data is not None:
                     self.stats['backyard_export'] += 1
                     self.debug_print("Found BackyardAI export format data")
                     return self.parse_backyard_format(json_data)
-            except:
-                pass
+            except Exception as e:
+                self.debug_print(f"Error decoding BackyardAI export base64: {e}")
                 
         except Exception as e:
             self.debug_print(f"BackyardAI export extraction failed: {e}")
         
         return None
     
+    def parse_json_payload(self, text, source):
+        """Parse the JSON object that starts at the first '{' in decoded payload text
+        
+        The object is decoded incrementally from that position, so the text is
+        scanned once. Anything after the object is reported rather than parsed.
+        """
+        start = text.find('{')
+        if start == -1:
+            return None
+        
+        json_data, end = JSON_DECODER.raw_decode(text, start)
+        if end < len(text):
+            trailing = text[end:].strip()
+            if trailing:
+                self.debug_print(f"{source}: ignoring {len(trailing)} trailing characters after JSON: {trailing[:40]!r}")
+        return json_data
+    
     def parse_backyard_format(self, json_data):
         """Parse BackyardAI format to standard format"""
         if 'character' in json_data:
@@ -331,45 +1668,54 @@ class BackyardToTavernConverter:
             character = json_data
         
         # Extract fields with fallbacks
-        result = {
-            'name': character.get('aiName', character.get('aiDisplayName', character.get('name', 'Unknown'))),
-            'description': character.get('aiPersona', character.get('description', character.get('persona', ''))),
-            'personality': character.get('personality', ''),
-            'scenario': character.get('scenario', ''),
-            'first_mes': character.get('firstMessage', character.get('greeting', character.get('first_mes', ''))),
-            'mes_example': character.get('customDialogue', character.get('examples', character.get('mes_example', ''))),
-        }
+        result = CharacterCard(
+            name=character.get('aiName', character.get('aiDisplayName', character.get('name', 'Unknown'))),
+            description=character.get('aiPersona', character.get('description', character.get('persona', ''))),
+            personality=character.get('personality', ''),
+            scenario=character.get('scenario', ''),
+            first_mes=character.get('firstMessage', character.get('greeting', character.get('first_mes', ''))),
+            mes_example=character.get('customDialogue', character.get('examples', character.get('mes_example', ''))),
+        )
         
         # Add display name if available
         if 'aiDisplayName' in character:
-            result['display_name'] = character['aiDisplayName']
+            result.display_name = character['aiDisplayName']
         elif 'display_name' in character:
-            result['display_name'] = character['display_name']
+            result.display_name = character['display_name']
         
         # Convert placeholders
         for key in ['description', 'personality', 'scenario', 'first_mes', 'mes_example']:
-            if result[key]:
-                result[key] = result[key].replace('{character}', '{{char}}')
-                result[key] = result[key].replace('{user}', '{{user}}')
+            value = getattr(result, key)
+            if value:
+                value = value.replace('{character}', '{{char}}')
+                setattr(result, key, value.replace('{user}', '{{user}}'))
         
         return result
     
     def generate_unique_filename(self, base_path):
-        """Generate a unique filename to prevent collisions"""
-        if not os.path.exists(base_path):
-            return base_path
+        """Generate a unique filename to prevent collisions
         
-        dir_name = os.path.dirname(base_path)
-        base_name = os.path.basename(base_path)
-        name_parts = os.path.splitext(base_name)
+        Batch runs share one FilenameRegistry instead; this lists the target
+        directory for a single name.
+        """
+        directory, filename = os.path.split(base_path)
+        return FilenameRegistry(directory).reserve(filename)
+    
+    def tavern_filename(self, input_path):
+        """Output file name for a converted file, preserving the original name"""
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
         
-        counter = 1
-        while True:
-            new_name = f"{name_parts[0]}_{counter}{name_parts[1]}"
-            new_path = os.path.join(dir_name, new_name)
-            if not os.path.exists(new_path):
-                return new_path
-            counter += 1
+        # If it already has .tavern in the name, don't double it
+        if '.tavern' in base_name.lower():
+            return os.path.basename(input_path)
+        return f"{base_name}.tavern.png"
+    
+    def json_path_for(self, output_path):
+        """Return the path of the JSON file written alongside a PNG card"""
+        json_path = output_path.replace('.tavern.png', '.tavern.json')
+        if not json_path.endswith('.json'):  # Safety check
+            json_path = output_path.replace('.png', '.tavern.json')
+        return json_path
     
     def sanitize_filename(self, name):
         """Sanitize a string for use in filename"""
@@ -386,6 +1732,53 @@ class BackyardToTavernConverter:
         return safe_name
     
     
+    def extract_character(self, input_path, png_index, use_database=True):
+        """Run the extractors in order, returning (CharacterCard, method name) or (None, None)"""
+        extracted_data = None
+        extraction_method = None
+        cached = None
+        
+        # Optimized extraction order based on what actually works
+        if use_database and self.db_cursor:
+            # Try database first when available (most reliable)
+            self.debug_print("Trying database extraction...")
+            extracted_data = self.get_character_data_from_db(input_path)
+            if extracted_data:
+                extraction_method = "Database"
+                self.stats['database_extraction'] += 1
+        
+        if not extracted_data and self.cache:
+            cached = self.cache.get(input_path, png_index)
+            if cached:
+                extracted_data, extraction_method = cached
+                self.stats['cache_hits'] += 1
+                self.debug_print(f"Extraction cache hit ({extraction_method})")
+        
+        if not extracted_data:
+            # Go straight to the extractor for the format the chunks point at
+            card_format = sniff_card_format(png_index)
+            if card_format:
+                self.debug_print(f"Sniffed card format: {card_format}")
+                extracted_data, extraction_method = self.extractors.extract(png_index, self.debug_print,
+                                                                            card_format=card_format)
+            if not extracted_data:
+                # Unrecognized (or misread) format: try the other extractors, most promising first
+                self.stats['format_misread' if card_format else 'unrecognized_format'] += 1
+                extracted_data, extraction_method = self.extractors.extract(png_index, self.debug_print,
+                                                                            exclude=card_format)
+        
+        if not extracted_data:
+            return None, None
+        
+        if self.cache and not cached and extraction_method != "Database":
+            self.cache.put(input_path, png_index, extracted_data, extraction_method)
+        
+        # Update method usage stats
+        if extraction_method not in self.stats['method_usage']:
+            self.stats['method_usage'][extraction_method] = 0
+        self.stats['method_usage'][extraction_method] += 1
+        return extracted_data, extraction_method
+    
     def convert_file(self, input_path, output_path=None, quiet=False, use_database=True, from_batch=False):
         """Convert a single file with optimized extraction order"""
         # Only increment total if not called from batch processing
@@ -400,9 +1793,9 @@ class BackyardToTavernConverter:
             return False
         
         try:
-            # Read the PNG file
-            with open(input_path, 'rb') as f:
-                png_data = f.read()
+            # Index the PNG once, reading only its metadata chunks; every extractor
+            # and the writer share this index
+            png_index = PngChunkIndex.from_file(input_path)
         except Exception as e:
             if not quiet:
                 print(f"Error reading file: {str(e)}")
@@ -410,38 +1803,7 @@ class BackyardToTavernConverter:
             self.failed_files.append(input_path)
             return False
         
-        extracted_data = None
-        extraction_method = None
-        
-        # Optimized extraction order based on what actually works
-        if use_database and self.db_cursor:
-            # Try database first when available (most reliable)
-            self.debug_print("Trying database extraction...")
-            extracted_data = self.get_character_data_from_db(input_path)
-            if extracted_data:
-                extraction_method = "Database"
-                self.stats['database_extraction'] += 1
-        
-        if not extracted_data:
-            # Try TavernAI format (common for imports)
-            self.debug_print("Trying TavernAI format extraction...")
-            extracted_data = self.extract_tavern_format(png_data)
-            if extracted_data:
-                extraction_method = "TavernAI format"
-        
-        if not extracted_data:
-            # Try BackyardAI export format (for exported files)
-            self.debug_print("Trying BackyardAI export format extraction...")
-            extracted_data = self.extract_backyard_export(png_data)
-            if extracted_data:
-                extraction_method = "BackyardAI export"
-
-        if not extracted_data:
-            # Try EXIF format (for alternate BackyardAI exports)
-            self.debug_print("Trying EXIF format extraction...")
-            extracted_data = self.extract_exif_format(png_data)
-            if extracted_data:
-                extraction_method = "EXIF format"
+        extracted_data, extraction_method = self.extract_character(input_path, png_index, use_database)
         
         if not extracted_data:
             if not quiet:
@@ -450,18 +1812,13 @@ class BackyardToTavernConverter:
             self.failed_files.append(input_path)
             return False
         
-        # Update method usage stats
-        if extraction_method not in self.stats['method_usage']:
-            self.stats['method_usage'][extraction_method] = 0
-        self.stats['method_usage'][extraction_method] += 1
-        
         # Create output filename if not specified
         if not output_path:
             if from_batch:
                 # For batch mode, use character names (current behavior)
                 base_name = os.path.splitext(os.path.basename(input_path))[0]
-                char_name = extracted_data.get('name', base_name)
-                display_name = extracted_data.get('display_name', '')
+                char_name = extracted_data.name if extracted_data.name is not None else base_name
+                display_name = extracted_data.display_name
                 
                 # Sanitize names for filename
                 safe_name = self.sanitize_filename(char_name)[:100]
@@ -474,27 +1831,21 @@ class BackyardToTavernConverter:
                     output_path = f"{safe_name}.tavern.png"
             else:
                 # For individual file mode, preserve original filename
-                base_name = os.path.splitext(os.path.basename(input_path))[0]
-                output_path = f"{base_name}.tavern.png"
-                
-                # If it already has .tavern in the name, don't double it
-                if '.tavern' in base_name.lower():
-                    output_path = os.path.basename(input_path)
-        
-        # Ensure unique filename
-        output_path = self.generate_unique_filename(output_path)
+                output_path = self.tavern_filename(input_path)
+            
+            # Ensure unique filename (explicit output paths are used as given,
+            # batch runs pick them up front and may overwrite earlier outputs)
+            output_path = self.generate_unique_filename(output_path)
         
         # Save the converted card
         try:
-            self.save_tavern_card(extracted_data, png_data, output_path)
+            self.save_tavern_card(extracted_data, png_index, output_path)
             
             # ALWAYS save as JSON
-            json_path = output_path.replace('.tavern.png', '.tavern.json')
-            if not json_path.endswith('.json'):  # Safety check
-                json_path = output_path.replace('.png', '.tavern.json')
+            json_path = self.json_path_for(output_path)
             
             with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(extracted_data, f, indent=2, ensure_ascii=False)
+                json.dump(extracted_data.to_dict(), f, indent=2, ensure_ascii=False)
             
             self.verbose_print(f"  Saved JSON: {os.path.basename(json_path)}")
             
@@ -516,52 +1867,56 @@ class BackyardToTavernConverter:
 
 
     def get_database_stats(self):
-        """Get statistics about the database content"""
+        """Get statistics about the database content
+        
+        All four counts come from one pass over the character tables; each
+        version's image link is checked through the join table's index.
+        """
         if not self.db_cursor:
             return None
         
-        stats = {}
-        
-        # Total character configs
-        self.db_cursor.execute("SELECT COUNT(*) FROM CharacterConfig")
-        stats['total_configs'] = self.db_cursor.fetchone()[0]
-        
-        # Non-user characters
-        self.db_cursor.execute("""
-            SELECT COUNT(*) FROM CharacterConfig 
-            WHERE isUserControlled = 0 AND isDefaultUserCharacter = 0
-        """)
-        stats['non_user_chars'] = self.db_cursor.fetchone()[0]
-        
-        # Characters with images
-        self.db_cursor.execute("""
-            SELECT COUNT(DISTINCT ccv.id)
-            FROM CharacterConfigVersion ccv
-            JOIN CharacterConfig cc ON ccv.characterConfigId = cc.id
-            JOIN _AppImageToCharacterConfigVersion aitc ON ccv.id = aitc.B
-            WHERE cc.isUserControlled = 0 AND cc.isDefaultUserCharacter = 0
-        """)
-        stats['chars_with_images'] = self.db_cursor.fetchone()[0]
-        
-        # Characters without images  
         self.db_cursor.execute("""
-            SELECT COUNT(DISTINCT ccv.id)
-            FROM CharacterConfigVersion ccv
-            JOIN CharacterConfig cc ON ccv.characterConfigId = cc.id
-            LEFT JOIN _AppImageToCharacterConfigVersion aitc ON ccv.id = aitc.B
-            WHERE cc.isUserControlled = 0 AND cc.isDefaultUserCharacter = 0
-            AND aitc.B IS NULL
+            SELECT
+                COUNT(DISTINCT cc.id),
+                COUNT(DISTINCT CASE WHEN non_user THEN cc.id END),
+                COALESCE(SUM(non_user AND ccv_id IS NOT NULL AND has_image), 0),
+                COALESCE(SUM(non_user AND ccv_id IS NOT NULL AND NOT has_image), 0)
+            FROM (
+                SELECT
+                    cc.id,
+                    ccv.id AS ccv_id,
+                    cc.isUserControlled = 0 AND cc.isDefaultUserCharacter = 0 AS non_user,
+                    EXISTS (SELECT 1 FROM _AppImageToCharacterConfigVersion aitc
+                            WHERE aitc.B = ccv.id) AS has_image
+                FROM CharacterConfig cc
+                LEFT JOIN CharacterConfigVersion ccv ON ccv.characterConfigId = cc.id
+            ) cc
         """)
-        stats['chars_without_images'] = self.db_cursor.fetchone()[0]
+        total_configs, non_user_chars, with_images, without_images = self.db_cursor.fetchone()
         
-        return stats
+        return {
+            'total_configs': total_configs,
+            'non_user_chars': non_user_chars,
+            'chars_with_images': with_images,
+            'chars_without_images': without_images,
+        }
     
     def save_tavern_card(self, char_data, original_png, output_path):
-        """Save character data as TavernAI card"""
+        """Save character data (a CharacterCard or plain dict) as TavernAI card"""
+        self.write_tavern_card(self.render_tavern_card(char_data, original_png), output_path)
+    
+    def render_tavern_card(self, char_data, original_png):
+        """Prepare a TavernAI card for writing, without touching the output file
+        
+        Returns (index, chunks, chara_chunk) for write_tavern_card: the source
+        PNG's chunk index, the chunks to write with None where the new chara
+        chunk goes, and that chunk's bytes.
+        """
+        if isinstance(char_data, dict):
+            char_data = CharacterCard.from_dict(char_data)
+        
         # Remove display_name from the data that goes into the card
-        card_data = char_data.copy()
-        if 'display_name' in card_data:
-            del card_data['display_name']
+        card_data = char_data.to_dict(include_display_name=False)
         
         # Add metadata
         card_data['metadata'] = {
@@ -577,97 +1932,226 @@ class BackyardToTavernConverter:
         
         # Encode as base64
         json_str = json.dumps(card_data, ensure_ascii=False)
-        chara_base64 = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
+        chara_base64 = base64.b64encode(json_str.encode('utf-8'))
         
-        # Parse PNG chunks
-        chunks = self.read_png_chunks(original_png)
+        # Index PNG chunks (reuses the index built during extraction)
+        index = self.get_chunk_index(original_png)
         
         # Remove existing tEXt chunks with 'chara' keyword
-        chunks = [c for c in chunks if not (c['type'] == 'tEXt' and b'chara\x00' in c.get('data', b''))]
+        chunks = [c for c in index.chunks
+                  if not (c[0] == 'tEXt' and index.find_in_chunk(c, b'chara\x00') != -1)]
         
         # Create new tEXt chunk
-        chara_data = b'chara\x00' + chara_base64.encode('latin-1')
-        chara_chunk = {
-            'type': 'tEXt',
-            'data': chara_data,
-            'crc': zlib.crc32(b'tEXt' + chara_data) & 0xffffffff
-        }
+        chara_data = b'chara\x00' + chara_base64
+        chara_chunk = (pack(">I", len(chara_data)) + b'tEXt' + chara_data +
+                       pack(">I", zlib.crc32(b'tEXt' + chara_data) & 0xffffffff))
         
-        # Insert before IEND
-        iend_index = next((i for i, c in enumerate(chunks) if c['type'] == 'IEND'), len(chunks)-1)
-        chunks.insert(iend_index, chara_chunk)
+        # Insert with the header chunks, ahead of the image data (or IEND)
+        insert_index = next((i for i, c in enumerate(chunks) if c[0] in ('IDAT', 'IEND')), len(chunks))
+        chunks.insert(insert_index, None)
+        return index, chunks, chara_chunk
+    
+    def write_tavern_card(self, rendered, output_path):
+        """Write a card prepared by render_tavern_card"""
+        index, chunks, chara_chunk = rendered
         
-        # Write new PNG
+        # Write new PNG. Metadata chunks come from the index; runs of image data
+        # that were never loaded are copied from the source file in bounded blocks
         with open(output_path, 'wb') as f:
-            f.write(b'\x89PNG\r\n\x1a\n')
+            f.write(PNG_SIGNATURE)
+            run_start = run_end = None
             for chunk in chunks:
-                length = pack(">I", len(chunk['data']))
-                chunk_type = chunk['type'].encode('ascii')
-                crc = pack(">I", chunk['crc'])
-                f.write(length + chunk_type + chunk['data'] + crc)
+                if chunk is not None and not index.is_loaded(chunk):
+                    _, offset, length, _ = chunk
+                    if run_end != offset:
+                        if run_start is not None:
+                            index.copy_range(f, run_start, run_end)
+                        run_start = offset
+                    run_end = offset + 12 + length
+                    continue
+                
+                if run_start is not None:
+                    index.copy_range(f, run_start, run_end)
+                    run_start = run_end = None
+                
+                if chunk is None:
+                    f.write(chara_chunk)
+                else:
+                    f.write(index.chunk_bytes(chunk))
+                    f.write(pack(">I", chunk[3]))
+            
+            if run_start is not None:
+                index.copy_range(f, run_start, run_end)
     
     def read_png_chunks(self, data):
         """Read PNG chunks from data"""
-        pos = 8  # Skip signature
-        chunks = []
-        while pos < len(data):
-            if pos + 8 > len(data):
-                break
-            length = unpack(">I", data[pos:pos + 4])[0]
-            chunk_type = data[pos + 4:pos + 8].decode('ascii', errors='ignore')
-            
-            if pos + 8 + length > len(data):
-                break
-                
-            chunk_data = data[pos + 8:pos + 8 + length]
-            crc = unpack(">I", data[pos + 8 + length:pos + 12 + length])[0] if pos + 12 + length <= len(data) else 0
-            
-            chunks.append({
-                'type': chunk_type,
-                'data': chunk_data,
-                'crc': crc
-            })
-            pos += 12 + length
-            if chunk_type == 'IEND':
-                break
-        return chunks
+        index = self.get_chunk_index(data)
+        return [{'type': chunk[0], 'data': bytes(index.chunk_data(chunk)), 'crc': chunk[3]}
+                for chunk in index.chunks]
     
 
-    def get_character_files_from_db(self):
-        """Get all character files from the BackyardAI database"""
+    def get_table_columns(self, table):
+        """Return the column names of a database table"""
+        self.db_cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1] for row in self.db_cursor.fetchall()}
+    
+    def character_query_filters(self, since=None, latest_only=False, include=(), exclude=(), ids=(),
+                                groups=()):
+        """Build the WHERE conditions shared by the batch query and its count
+        
+        include/exclude are name patterns (matched against name or display
+        name), ids are CharacterConfigVersion or CharacterConfig ids, and
+        groups are group name patterns. Patterns use * and ? wildcards and
+        ignore case. Returns (conditions, params, changed_at), where changed_at
+        is the SQL expression for a version's last change in epoch milliseconds.
+        """
+        # BackyardAI has added updatedAt to versions over time, use it when present
+        changed_at = sql_timestamp_ms('ccv.createdAt')
+        if 'updatedAt' in self.get_table_columns('CharacterConfigVersion'):
+            changed_at = f"MAX({changed_at}, COALESCE({sql_timestamp_ms('ccv.updatedAt')}, 0))"
+        
+        conditions = ["cc.isUserControlled = 0", "cc.isDefaultUserCharacter = 0"]
+        params = []
+        if since is not None:
+            conditions.append(f"{changed_at} > ?")
+            params.append(since)
+        if latest_only:
+            conditions.append("""ccv.id = (
+                SELECT latest.id FROM CharacterConfigVersion latest
+                WHERE latest.characterConfigId = cc.id
+                ORDER BY latest.createdAt DESC, latest.id DESC
+                LIMIT 1)""")
+        
+        name_match = ("(COALESCE(ccv.name, '') LIKE ? ESCAPE '\\'"
+                      " OR COALESCE(ccv.displayName, '') LIKE ? ESCAPE '\\')")
+        if include:
+            conditions.append("(" + " OR ".join([name_match] * len(include)) + ")")
+            for pattern in include:
+                params.extend([like_pattern(pattern)] * 2)
+        for pattern in exclude:
+            conditions.append(f"NOT {name_match}")
+            params.extend([like_pattern(pattern)] * 2)
+        if ids:
+            placeholders = ', '.join('?' * len(ids))
+            conditions.append(f"(ccv.id IN ({placeholders}) OR cc.id IN ({placeholders}))")
+            params.extend(list(ids) * 2)
+        if groups:
+            group_match = " OR ".join(["gc.name LIKE ? ESCAPE '\\'"] * len(groups))
+            conditions.append(f"""EXISTS (
+                SELECT 1 FROM _CharacterConfigToGroupConfig ccgc
+                JOIN GroupConfig gc ON gc.id = ccgc.B
+                WHERE ccgc.A = cc.id AND ({group_match}))""")
+            params.extend(like_pattern(pattern) for pattern in groups)
+        return conditions, params, changed_at
+    
+    def count_character_files_from_db(self, limit=None, shard=None, **filters):
+        """Count the versions a batch export would return, and how many have no image
+        
+        Takes the same filters as iter_character_files_from_db. With a
+        ShardPlan, only versions in that shard are counted (after any limit).
+        A version whose image file is missing counts as having no image, as it
+        will be exported as JSON only. Returns (0, 0) if the database can't be
+        read.
+        """
         if not self.db_cursor:
-            return []
+            return 0, 0
         
         try:
-            # Modified query to include characters without images using LEFT JOIN
-            query = """
-            SELECT DISTINCT 
+            conditions, params, _ = self.character_query_filters(**filters)
+            limit_clause = ""
+            if limit is not None:
+                limit_clause = "ORDER BY ccv.name, ccv.id LIMIT ?"
+                params.append(limit)
+            shard_clause = ""
+            if shard is not None:
+                self.db_conn.create_function('in_shard', 1, shard.contains, deterministic=True)
+                shard_clause = "WHERE in_shard(version_id)"
+            self.db_cursor.execute(f"""
+                SELECT image_url
+                FROM (
+                    SELECT
+                        ccv.id AS version_id,
+                        (SELECT ai.imageUrl
+                         FROM _AppImageToCharacterConfigVersion aitc
+                         JOIN AppImage ai ON aitc.A = ai.id
+                         WHERE aitc.B = ccv.id) AS image_url
+                    FROM CharacterConfig cc
+                    JOIN CharacterConfigVersion ccv ON cc.id = ccv.characterConfigId
+                    WHERE {' AND '.join(conditions)}
+                    {limit_clause}
+                )
+                {shard_clause}
+            """, params)
+            images = ImageDirectoryIndex(self.path_maps)
+            total = no_image = 0
+            for image_url, in self.db_cursor:
+                total += 1
+                if not image_url or not images.resolve(image_url):
+                    no_image += 1
+            return total, no_image
+        except Exception as e:
+            print(f"Error reading database: {str(e)}")
+            return 0, 0
+    
+    def iter_character_files_from_db(self, limit=None, **filters):
+        """Yield character files from the BackyardAI database as rows are read
+        
+        Rows are pulled lazily, so memory use doesn't grow with the size of the
+        library. A private snapshot is read with one query. Otherwise rows are
+        read DB_PAGE_SIZE at a time, each page fetched in full: an open query
+        holds a shared lock, and with BackyardAI's rollback journal that keeps
+        the app from saving until the query is done. With since (epoch milliseconds), only
+        versions created or updated after that time are returned. With
+        latest_only, only the newest version of each character is returned
+        instead of its whole edit history. The other filters are described in
+        character_query_filters; they're applied in the query, so rows they
+        leave out are never read. Stops after limit versions if given.
+        """
+        if not self.db_cursor or limit == 0:
+            return
+        
+        try:
+            conditions, params, changed_at = self.character_query_filters(**filters)
+            
+            # Modified query to include characters without images using LEFT JOIN.
+            # Greeting and example dialogue come from the character's most recent
+            # chat, picked by one lookup per version rather than joining every
+            # chat and collapsing them with GROUP BY.
+            query = f"""
+            SELECT 
                 ccv.id as version_id,
                 ccv.name,
                 ccv.displayName,
                 ccv.persona,
                 ai.imageUrl,
-                MAX(c.greetingDialogue) as greetingDialogue,
-                MAX(c.customDialogue) as customDialogue
+                c.greetingDialogue,
+                c.customDialogue,
+                {changed_at} as changedAt
             FROM CharacterConfig cc
             JOIN CharacterConfigVersion ccv ON cc.id = ccv.characterConfigId
             LEFT JOIN _AppImageToCharacterConfigVersion aitc ON ccv.id = aitc.B
             LEFT JOIN AppImage ai ON aitc.A = ai.id
-            LEFT JOIN _CharacterConfigToGroupConfig ccgc ON cc.id = ccgc.A
-            LEFT JOIN GroupConfig gc ON ccgc.B = gc.id
-            LEFT JOIN Chat c ON gc.id = c.groupConfigId
-            WHERE cc.isUserControlled = 0 
-            AND cc.isDefaultUserCharacter = 0
-            GROUP BY ccv.id, ccv.name, ccv.displayName, ccv.persona, ai.imageUrl
-            ORDER BY ccv.name
+            LEFT JOIN Chat c ON c.id = (
+                SELECT chat.id
+                FROM _CharacterConfigToGroupConfig ccgc
+                JOIN Chat chat ON chat.groupConfigId = ccgc.B
+                WHERE ccgc.A = cc.id
+                ORDER BY chat.createdAt DESC
+                LIMIT 1)
+            WHERE {' AND '.join(conditions)} {{after}}
+            ORDER BY ccv.name, ccv.id
+            {{page}}
             """
             
-            self.db_cursor.execute(query)
-            character_files = []
+            if self.db_snapshot in ('immutable', 'memory', 'file'):
+                rows = self.iter_query(query.replace("{after}", "").replace("{page}", ""), params)
+            else:
+                rows = self.iter_query_pages(query, params)
             seen_versions = set()  # Track character versions to avoid true duplicates
+            images = ImageDirectoryIndex(self.path_maps)
             
-            for row in self.db_cursor.fetchall():
-                version_id, name, display_name, persona, image_url, greeting, custom_dialogue = row
+            for row in rows:
+                version_id, name, display_name, persona, image_url, greeting, custom_dialogue, changed = row
                 
                 # Skip if we've already processed this character version
                 if version_id in seen_versions:
@@ -675,148 +2159,594 @@ class BackyardToTavernConverter:
                 seen_versions.add(version_id)
                 
                 # Include all characters, even without images
-                character_info = {
-                    'version_id': version_id,
-                    'name': name or 'Unknown',
-                    'display_name': display_name,
-                    'persona': persona,
-                    'greeting': greeting,
-                    'custom_dialogue': custom_dialogue,
-                    'has_image': False,
-                    'path': None
-                }
+                character_info = CharacterRow(version_id, name or 'Unknown', display_name, persona,
+                                              greeting, custom_dialogue, changed_at=changed)
                 
                 # Check if image exists
                 if image_url:
-                    normalized_path = os.path.normpath(image_url)
-                    if os.path.exists(normalized_path):
-                        character_info['path'] = normalized_path
-                        character_info['has_image'] = True
+                    image_path = images.resolve(image_url)
+                    if image_path:
+                        character_info.path = image_path
+                        character_info.has_image = True
                     else:
                         self.debug_print(f"Image not found for {name}: {image_url}")
                 
-                character_files.append(character_info)
-            
-            return character_files
+                yield character_info
+                if limit is not None and len(seen_versions) >= limit:
+                    break
             
         except Exception as e:
             print(f"Error reading database: {str(e)}")
             import traceback
             traceback.print_exc()
-            return []
+            self.db_read_failed = True
+    
+    def iter_query(self, query, params):
+        """Yield the rows of a query from its own cursor, so lookups made meanwhile don't reset it"""
+        cursor = self.db_conn.cursor()
+        cursor.execute(query, params)
+        yield from cursor
+    
+    def iter_query_pages(self, query, params):
+        """Yield the rows of a batch query a page at a time, ordered by (name, id)
+        
+        query has {after} and {page} placeholders for the keyset condition and
+        LIMIT clause; each page starts after the last (name, id) seen, so no
+        query stays open between pages.
+        """
+        after, after_params = "", []
+        while True:
+            cursor = self.db_conn.cursor()
+            cursor.execute(query.replace("{after}", after).replace("{page}", "LIMIT ?"),
+                           params + after_params + [DB_PAGE_SIZE])
+            rows = cursor.fetchall()
+            yield from rows
+            if len(rows) < DB_PAGE_SIZE:
+                return
+            version_id, name = rows[-1][0], rows[-1][1]
+            # NULL names sort first, and never compare equal
+            if name is None:
+                after = "AND (ccv.name IS NOT NULL OR ccv.id > ?)"
+                after_params = [version_id]
+            else:
+                after = "AND (ccv.name > ? OR (ccv.name = ? AND ccv.id > ?))"
+                after_params = [name, name, version_id]
+    
+    def shard_costs(self):
+        """Yield (version_id, estimated cost) for every exportable version
+        
+        The estimate is the persona length plus the image file size. Filters
+        are deliberately not applied, so the cost balanced shard assignment
+        stays the same from run to run.
+        """
+        images = ImageDirectoryIndex(self.path_maps)
+        cursor = self.db_conn.cursor()
+        cursor.execute("""
+            SELECT ccv.id, LENGTH(COALESCE(ccv.persona, '')), MAX(ai.imageUrl)
+            FROM CharacterConfig cc
+            JOIN CharacterConfigVersion ccv ON cc.id = ccv.characterConfigId
+            LEFT JOIN _AppImageToCharacterConfigVersion aitc ON ccv.id = aitc.B
+            LEFT JOIN AppImage ai ON aitc.A = ai.id
+            WHERE cc.isUserControlled = 0 AND cc.isDefaultUserCharacter = 0
+            GROUP BY ccv.id
+        """)
+        for version_id, persona_length, image_url in cursor:
+            yield version_id, persona_length + (images.size(image_url) if image_url else 0)
+    
+    def get_character_files_from_db(self, **filters):
+        """Get all character files from the BackyardAI database as a list"""
+        return list(self.iter_character_files_from_db(**filters))
 
 
-    def convert_batch(self, files, output_dir='converted_cards'):
-        """Convert multiple files"""
+    def batch_display_text(self, file_info):
+        """Build the progress text shown for a batch entry"""
+        if not isinstance(file_info, CharacterRow):
+            # Legacy support for simple file paths
+            return os.path.basename(file_info)[:50]
+        
+        char_name = file_info.name
+        display_name = file_info.display_name
+        
+        display_text = char_name[:30]
+        if display_name and display_name != char_name:
+            display_text += f" ({display_name[:20]})"
+        if not file_info.has_image:
+            display_text += " [JSON-only]"
+        return display_text
+    
+    def batch_output_path(self, file_info, output_dir, names):
+        """Reserve the output path for a batch entry in a FilenameRegistry, based on character names
+        
+        Plain file paths keep their original file name, as in single file mode.
+        """
+        if not isinstance(file_info, CharacterRow):
+            output_filename = self.tavern_filename(file_info)
+        else:
+            char_name = file_info.name
+            display_name = file_info.display_name
+            extension = '.tavern.png' if file_info.has_image else '.tavern.json'
+            
+            safe_name = self.sanitize_filename(char_name)[:100]
+            if display_name and display_name != char_name:
+                safe_display = self.sanitize_filename(display_name)[:50]
+                output_filename = f"{safe_name} ({safe_display}){extension}"
+            else:
+                output_filename = f"{safe_name}{extension}"
+        
+        # The registry keeps the accompanying JSON's name free along with the PNG's
+        return names.reserve(output_filename)
+    
+    def convert_batch_entry(self, file_info, output_path):
+        """Convert a single batch entry, returning (success, status mark)"""
+        if not isinstance(file_info, CharacterRow):
+            # Pass from_batch=True to prevent double counting
+            success = self.convert_file(file_info, output_path, quiet=True, from_batch=True)
+            return success, '' if success else '✗'
+        
+        # Handle characters without images
+        if not file_info.has_image:
+            char_data = self.database_row_card(file_info)
+            
+            # Save as JSON only
+            try:
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    json.dump(char_data.to_dict(), f, indent=2, ensure_ascii=False)
+                self.stats['success'] += 1
+                self.stats['json_only'] += 1
+                return True, '✓ (JSON)'
+            except Exception as e:
+                self.stats['failed'] += 1
+                return False, f"✗ {str(e)}"
+        
+        # Normal processing for characters with images
+        # Pass from_batch=True to prevent double counting
+        success = self.convert_file(file_info.path, output_path, quiet=True, from_batch=True)
+        
+        if success:
+            self.stats['png_files'] += 1
+            return True, ''
+        return False, '✗'
+    
+    def database_row_card(self, row):
+        """Build the card for a database row that has no image, from the row itself"""
+        char_name = row.name
+        
+        # Extract character data directly from the database info
+        char_data = CharacterCard(
+            name=char_name,
+            display_name=row.display_name or char_name,
+            description=row.persona or '',
+            personality='',
+            scenario='',
+            first_mes=row.greeting or '',
+            mes_example=row.custom_dialogue or '',
+        )
+        
+        # Parse persona field if available
+        if row.persona:
+            char_data = self.parse_persona_field(row.persona, char_data)
+        return char_data
+    
+    def merge_stats(self, stats, failed_files):
+        """Fold counters and failures reported by a batch worker into this converter"""
+        for key, value in stats.items():
+            if key == 'method_usage':
+                for method, count in value.items():
+                    self.stats['method_usage'][method] = self.stats['method_usage'].get(method, 0) + count
+            elif key != 'total':
+                self.stats[key] = self.stats.get(key, 0) + value
+        self.failed_files.extend(failed_files)
+    
+    def run_batch_task(self, task):
+        """Convert one planned batch entry, returning (success, mark, source fingerprint)"""
+        file_info, output_path, fingerprint = task
+        success, mark = self.convert_batch_entry(file_info, output_path)
+        return success, mark, source_fingerprint(file_info) if fingerprint else None
+    
+    def batch_outputs(self, output_path):
+        """Files written for a batch entry with the given primary output path"""
+        if not output_path:
+            return []
+        if output_path.endswith('.png'):
+            return [output_path, self.json_path_for(output_path)]
+        return [output_path]
+    
+    def plan_batch_tasks(self, files, output_dir, manifest=None, force=False, retry_failed=False,
+                         selected=None):
+        """Yield (position, task) for each entry of files that needs converting
+        
+        Output names are assigned here, in input order, so they don't depend on
+        which worker happens to finish first. Names from earlier runs stay taken.
+        Entries the manifest says to skip are counted but not yielded. Entries
+        rejected by selected (another shard's) only have their names reserved,
+        so every shard names its entries exactly as a single full run would.
+        """
+        names = FilenameRegistry(output_dir)
+        if manifest:
+            for path in manifest.output_paths():
+                names.add(path)
+        position = 0
+        for file_info in files:
+            if selected is not None and not selected(file_info):
+                key = manifest.key_for(file_info) if manifest else None
+                has_image = file_info.has_image if isinstance(file_info, CharacterRow) else True
+                if not (manifest and manifest.previous_output(key, '.png' if has_image else '.json')):
+                    self.batch_output_path(file_info, output_dir, names)
+                continue
+            
+            position += 1
+            output_path = None
+            if manifest:
+                key = manifest.key_for(file_info)
+                if retry_failed and not manifest.is_failed(key):
+                    self.stats['skipped'] += 1
+                    continue
+                if not force and not retry_failed and manifest.is_unchanged(key, file_info):
+                    self.stats['skipped'] += 1
+                    if isinstance(file_info, CharacterRow):
+                        manifest.track_change_time(file_info.changed_at, True)
+                    continue
+                has_image = file_info.has_image if isinstance(file_info, CharacterRow) else True
+                output_path = manifest.previous_output(key, '.png' if has_image else '.json')
+            if output_path is None:
+                output_path = self.batch_output_path(file_info, output_dir, names)
+            yield position, (file_info, output_path, manifest is not None)
+    
+    def convert_batch(self, files, output_dir='converted_cards', jobs=1, resume=True, force=False,
+                      retry_failed=False, manifest=None, total=None, selected=None, io_threads=0,
+                      inflight_bytes=INFLIGHT_BYTES, watermark_scope=None):
+        """Convert multiple files, optionally spread across worker processes
+        
+        files may be any iterable, such as iter_character_files_from_db(), and
+        is consumed as the batch runs; pass total when it has no len(). Only
+        entries accepted by selected (if given) are converted, and total should
+        count just those.
+        With resume, a manifest in output_dir records each entry's result so a
+        re-run skips unchanged entries (all but failed ones with retry_failed),
+        and force reconverts everything while keeping previous output names.
+        With watermark_scope, a run that converted every entry it was given
+        advances that scope's --since auto watermark in the manifest.
+        With io_threads (and a single job), reading and writing run on that
+        many threads each, around conversion in this thread; see
+        convert_batch_pipeline.
+        """
         try:
             os.makedirs(output_dir, exist_ok=True)
         except Exception as e:
             print(f"Error creating output directory: {str(e)}")
             return
         
-        # Set the total count once at the beginning
-        self.stats['total'] = len(files)
+        if total is None:
+            total = len(files)
+            no_image_count = sum(1 for f in files if isinstance(f, CharacterRow) and not f.has_image)
+            if no_image_count > 0:
+                print(f"\nNote: {no_image_count} characters have no images (will export as JSON only)")
+        
+        # Count the whole batch up front (watch mode adds every run's batch)
+        self.stats['total'] += total
         
-        no_image_count = sum(1 for f in files if not f.get('has_image', True))
-        if no_image_count > 0:
-            print(f"\nNote: {no_image_count} characters have no images (will export as JSON only)")
+        if resume and manifest is None:
+            manifest = ConversionManifest.load(output_dir)
+        elif not resume:
+            manifest = None
+        if manifest:
+            manifest.start_run()
         
-        print(f"\nConverting {len(files)} characters to: {output_dir}")
+        print(f"\nConverting {total} characters to: {output_dir}")
         print("-" * 60)
         
-        for i, file_info in enumerate(files, 1):
-            if isinstance(file_info, dict):
-                char_name = file_info.get('name', 'Unknown')
-                display_name = file_info.get('display_name', '')
-                has_image = file_info.get('has_image', True)
-                
-                # Create display text for progress
-                display_text = char_name[:30]
-                if display_name and display_name != char_name:
-                    display_text += f" ({display_name[:20]})"
+        tasks = self.plan_batch_tasks(files, output_dir, manifest, force, retry_failed, selected)
+        if jobs > 1 and total > 1:
+            results = self.convert_batch_parallel(tasks, jobs)
+        elif io_threads > 0:
+            results = self.convert_batch_pipeline(tasks, io_threads, inflight_bytes)
+        else:
+            results = ((position, task, self.run_batch_task(task)) for position, task in tasks)
+        
+        self.db_read_failed = False
+        converted = 0
+        try:
+            for converted, (position, task, result) in enumerate(results, 1):
+                file_info, output_path, _ = task
+                success, mark, fingerprint = result
+                print(f"[{position}/{total}] Converting: {self.batch_display_text(file_info)}...", end=' ')
+                if mark:
+                    print(mark)
                 
-                # Handle characters without images
-                if not has_image:
-                    display_text += " [JSON-only]"
-                    print(f"[{i}/{len(files)}] Converting: {display_text}...", end=' ')
-                    
-                    # Extract character data directly from the database info
-                    char_data = {
-                        'name': char_name,
-                        'display_name': display_name or char_name,
-                        'description': file_info.get('persona', ''),
-                        'personality': '',
-                        'scenario': '',
-                        'first_mes': file_info.get('greeting', ''),
-                        'mes_example': file_info.get('custom_dialogue', ''),
-                    }
-                    
-                    # Parse persona field if available
-                    if file_info.get('persona'):
-                        char_data = self.parse_persona_field(file_info['persona'], char_data)
-                    
-                    # Save as JSON only
-                    safe_name = self.sanitize_filename(char_name)[:100]
-                    if display_name and display_name != char_name:
-                        safe_display = self.sanitize_filename(display_name)[:50]
-                        json_filename = f"{safe_name} ({safe_display}).tavern.json"
-                    else:
-                        json_filename = f"{safe_name}.tavern.json"
-                    
-                    json_path = os.path.join(output_dir, json_filename)
-                    json_path = self.generate_unique_filename(json_path)
-                    
+                if manifest:
+                    manifest.record(manifest.key_for(file_info), success, fingerprint,
+                                    self.batch_outputs(output_path))
+                    if isinstance(file_info, CharacterRow):
+                        manifest.track_change_time(file_info.changed_at, success)
+                    if converted % MANIFEST_SAVE_INTERVAL == 0:
+                        manifest.save()
+            
+            if self.stats['skipped']:
+                reason = "not previously failed" if retry_failed else "unchanged since the last run"
+                print(f"\nSkipped {self.stats['skipped']} characters ({reason})")
+            
+            if self.db_read_failed:
+                # Rows come by name, not change time, so the watermark must stay put
+                unread = total - converted
+                print(f"\n✗ Reading the database stopped early, {unread} characters were not converted")
+                self.stats['failed'] += unread
+            elif manifest and watermark_scope is not None:
+                manifest.advance_watermark(watermark_scope)
+        finally:
+            if manifest:
+                manifest.save()
+    
+    def convert_batch_parallel(self, tasks, jobs):
+        """Convert planned batch entries on a pool of worker processes
+        
+        Takes and yields (position, task) pairs as produced by plan_batch_tasks,
+        with the result added, in order. Tasks are sent to workers in small
+        chunks and only a few chunks are in flight at once, so the input is
+        read no faster than it's converted.
+        """
+        db_path, snapshot = self.worker_database() if self.db_cursor else (None, None)
+        cache = (self.cache.path, self.cache.max_bytes) if self.cache else None
+        pending = deque()
+        
+        def collect():
+            chunk, future = pending.popleft()
+            for (position, task), (success, mark, fingerprint, stats, failed_files) in zip(chunk, future.result()):
+                self.merge_stats(stats, failed_files)
+                yield position, task, (success, mark, fingerprint)
+        
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker,
+                                 initargs=(self.debug, self.verbose, db_path, snapshot, cache)) as executor:
+            tasks = iter(tasks)
+            while True:
+                chunk = list(islice(tasks, BATCH_CHUNK_SIZE))
+                if not chunk:
+                    break
+                pending.append((chunk, executor.submit(_run_batch_worker_chunk, [task for _, task in chunk])))
+                if len(pending) >= jobs * 2:
+                    yield from collect()
+            while pending:
+                yield from collect()
+
+
+    def convert_batch_pipeline(self, tasks, io_threads=2, inflight_bytes=INFLIGHT_BYTES):
+        """Convert planned batch entries in read, convert and write stages
+        
+        Reader threads load each source PNG's metadata (and fingerprint its
+        image), this thread extracts and encodes the card, and writer threads
+        write the outputs, so disk or network latency overlaps the CPU work.
+        Database access stays on this thread. Readers wait before reading while
+        entries holding more than inflight_bytes are between stages. Takes (position,
+        task) pairs like convert_batch_parallel and yields them with results,
+        in order.
+        """
+        budget = ByteBudget(inflight_bytes)
+        task_queue = queue.Queue()
+        write_queue = queue.Queue(maxsize=io_threads * 2)
+        events = queue.Queue()  # ('read' | 'written', item), or the item None when a thread finishes
+        
+        def reader():
+            while True:
+                item = task_queue.get()
+                if item is not None:
+                    # Reserve the whole file, which is the most a read can load,
+                    # then count what the read actually kept
                     try:
-                        with open(json_path, 'w', encoding='utf-8') as f:
-                            json.dump(char_data, f, indent=2, ensure_ascii=False)
-                        print("✓ (JSON)")
-                        self.stats['success'] += 1
-                        self.stats['json_only'] += 1
-                    except Exception as e:
-                        print(f"✗ {str(e)}")
-                        self.stats['failed'] += 1
-                    
-                    continue
-                
-                # Normal processing for characters with images
-                file_path = file_info['path']
-                
-                # Generate proper output filename based on character names
-                safe_name = self.sanitize_filename(char_name)[:100]
-                if display_name and display_name != char_name:
-                    safe_display = self.sanitize_filename(display_name)[:50]
-                    output_filename = f"{safe_name} ({safe_display}).tavern.png"
+                        reserved = os.stat(item.source).st_size if item.source else 0
+                    except OSError:
+                        reserved = 0
+                    budget.acquire(reserved)
+                    self.read_pipeline_item(item)
+                    budget.resize(reserved, item.size)
+                events.put(('read', item))
+                if item is None:
+                    return
+        
+        def writer():
+            while True:
+                item = write_queue.get()
+                if item is not None:
+                    self.write_pipeline_item(item)
+                    budget.release(item.size)
+                events.put(('written', item))
+                if item is None:
+                    return
+        
+        for target in [reader] * io_threads + [writer] * io_threads:
+            threading.Thread(target=target, daemon=True).start()
+        
+        tasks = iter(tasks)
+        queued = 0
+        feeding = True
+        readers_left = writers_left = io_threads
+        ready = {}
+        next_sequence = 0
+        
+        while writers_left:
+            # Keep a couple of entries per reader queued up
+            while feeding and task_queue.qsize() < io_threads * 2:
+                task = next(tasks, None)
+                if task is None:
+                    feeding = False
+                    for _ in range(io_threads):
+                        task_queue.put(None)
                 else:
-                    output_filename = f"{safe_name}.tavern.png"
-                
-                output_path = os.path.join(output_dir, output_filename)
-                
-                print(f"[{i}/{len(files)}] Converting: {display_text}...", end=' ')
-                
-                # Ensure unique filename
-                output_path = self.generate_unique_filename(output_path)
-                
-                # Pass from_batch=True to prevent double counting
-                success = self.convert_file(file_path, output_path, quiet=True, from_batch=True)
-                
-                if success:
-                    self.stats['png_files'] += 1
+                    task_queue.put(PipelineItem(queued, *task))
+                    queued += 1
+            
+            stage, item = events.get()
+            if stage == 'read':
+                if item is None:
+                    readers_left -= 1
+                    if not readers_left:
+                        for _ in range(io_threads):
+                            write_queue.put(None)
                 else:
-                    print("✗")
+                    loaded = item.size
+                    self.convert_pipeline_item(item)
+                    budget.resize(loaded, item.size)
+                    write_queue.put(item)
+            elif item is None:
+                writers_left -= 1
+            else:
+                ready[item.sequence] = item
+                while next_sequence in ready:
+                    done = ready.pop(next_sequence)
+                    next_sequence += 1
+                    yield done.position, done.task, self.finish_pipeline_item(done)
+    
+    def read_pipeline_item(self, item):
+        """Reader stage: load the source PNG's metadata and fingerprint the entry"""
+        file_info, _, fingerprint = item.task
+        try:
+            if fingerprint:
+                item.fingerprint = source_fingerprint(file_info)
+            if item.source:
+                if not os.path.exists(item.source):
+                    raise FileNotFoundError(f"File not found: {item.source}")
+                item.index = PngChunkIndex.from_file(item.source)
+                item.size = len(item.index.data) + sum(len(data) for data in item.index.tail.values())
+        except Exception as e:
+            item.error = str(e)
+    
+    def convert_pipeline_item(self, item):
+        """Convert stage: extract the character and encode both outputs"""
+        if item.error:
+            return
+        try:
+            if item.source:
+                card, _ = self.extract_character(item.source, item.index)
+                if not card:
+                    item.error = "no character data found"
+                    return
+                item.rendered = self.render_tavern_card(card, item.index)
+                item.size += len(item.rendered[2])
+            else:
+                card = self.database_row_card(item.task[0])
+            item.json_text = json.dumps(card.to_dict(), indent=2, ensure_ascii=False)
+            item.size += len(item.json_text)
+        except Exception as e:
+            item.error = str(e)
+    
+    def write_pipeline_item(self, item):
+        """Writer stage: write the card PNG (if any) and its JSON"""
+        if item.error:
+            return
+        output_path = item.task[1]
+        try:
+            if item.rendered:
+                self.write_tavern_card(item.rendered, output_path)
+                json_path = self.json_path_for(output_path)
             else:
-                # Legacy support for simple file paths  
-                file_path = file_info
-                display_text = os.path.basename(file_path)[:50]
-                output_path = None
+                json_path = output_path
+            with open(json_path, 'w', encoding='utf-8') as f:
+                f.write(item.json_text)
+        except Exception as e:
+            item.error = str(e)
+        finally:
+            # Drop the buffers now rather than when the results are collected
+            item.index = item.rendered = item.json_text = None
+    
+    def finish_pipeline_item(self, item):
+        """Count a finished pipeline entry like convert_batch_entry does, returning its result"""
+        if item.error:
+            self.debug_print(f"Batch entry failed: {item.error}")
+        file_info = item.task[0]
+        success = not item.error
+        if isinstance(file_info, CharacterRow) and not file_info.has_image:
+            if success:
+                self.stats['success'] += 1
+                self.stats['json_only'] += 1
+                return True, '✓ (JSON)', item.fingerprint
+            self.stats['failed'] += 1
+            return False, f"✗ {item.error}", item.fingerprint
+        
+        if success:
+            self.stats['success'] += 1
+            if isinstance(file_info, CharacterRow):
+                self.stats['png_files'] += 1
+            return True, '', item.fingerprint
+        self.stats['failed'] += 1
+        self.failed_files.append(item.source)
+        return False, '✗', item.fingerprint
+    
+    def export_database(self, output_dir, manifest, filters=None, shard=None, **batch_options):
+        """Convert the database characters matching the filters, returning how many there were
+        
+        filters are keyword arguments for iter_character_files_from_db. With
+        a ShardPlan only that shard's characters are converted, though every
+        matching row is still read to plan output names.
+        """
+        filters = filters or {}
+        
+        # Only a run that covered every matching change since the watermark may move it
+        scope = ConversionManifest.watermark_scope(filters)
+        since = filters.get('since')
+        if batch_options.get('retry_failed') or (since is not None and scope is not None and
+                                                 (scope not in manifest.watermarks or
+                                                  since > manifest.watermarks[scope])):
+            scope = None
+        
+        total, no_image_count = self.count_character_files_from_db(shard=shard, **filters)
+        if total:
+            print(f"Found {total} character files in database")
+            if no_image_count > 0:
+                print(f"\nNote: {no_image_count} characters have no images (will export as JSON only)")
+            files = self.iter_character_files_from_db(**filters)
+            selected = (lambda row: shard.contains(row.version_id)) if shard else None
+            self.convert_batch(files, output_dir, manifest=manifest, total=total, selected=selected,
+                               watermark_scope=scope, **batch_options)
+        return total
+    
+    def watch_database(self, output_dir, manifest, filters=None, poll_interval=2.0, debounce=1.0, shard=None,
+                       **batch_options):
+        """Convert characters as they are added or edited, until interrupted
+        
+        The connection stays open and PRAGMA data_version is polled every
+        poll_interval seconds; it changes whenever another connection (the
+        BackyardAI app) commits. Once it has held still for debounce seconds,
+        only versions changed since the manifest's watermark are converted.
+        """
+        last_version = self.db_cursor.execute("PRAGMA data_version").fetchone()[0]
+        print(f"\nWatching for changes every {poll_interval:g}s (Ctrl+C to stop)...")
+        
+        try:
+            while True:
+                time.sleep(poll_interval)
+                version = self.db_cursor.execute("PRAGMA data_version").fetchone()[0]
+                if version == last_version:
+                    continue
                 
-                print(f"[{i}/{len(files)}] Converting: {display_text}...", end=' ')
-                # Also pass from_batch=True here
-                success = self.convert_file(file_path, output_path, quiet=True, from_batch=True)
+                # Let a burst of edits settle before converting
+                settled_at = time.monotonic()
+                while time.monotonic() - settled_at < debounce:
+                    time.sleep(min(poll_interval, debounce))
+                    current = self.db_cursor.execute("PRAGMA data_version").fetchone()[0]
+                    if current != version:
+                        version = current
+                        settled_at = time.monotonic()
+                last_version = version
                 
-                if not success:
-                    print("✗")
-
-
+                # New characters can bring new images with them
+                self.image_lookup = None
+                since = manifest.watermarks.get(ConversionManifest.watermark_scope(filters or {}))
+                self.debug_print(f"Database changed, looking for versions newer than {since}")
+                found = self.export_database(output_dir, manifest, dict(filters or {}, since=since), shard,
+                                             **batch_options)
+                self.flush_cache()
+                if found:
+                    print(f"\nWatching for changes every {poll_interval:g}s (Ctrl+C to stop)...")
+        except KeyboardInterrupt:
+            print("\nStopped watching")
+    
+    def write_summary(self, path, **details):
+        """Save the conversion counters and failures as JSON, e.g. one file per shard to add up later"""
+        summary = dict(details, stats=self.stats, failed_files=self.failed_files)
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            print(f"Warning: couldn't write summary {path}: {str(e)}")
+    
     def print_summary(self):
         """Print conversion summary"""
         print("\n" + "=" * 60)
@@ -825,6 +2755,14 @@ class BackyardToTavernConverter:
         print(f"Total characters: {self.stats['total']}")
         print(f"Successful: {self.stats['success']}")
         print(f"Failed: {self.stats['failed']}")
+        if self.stats.get('skipped'):
+            print(f"Skipped (already converted): {self.stats['skipped']}")
+        if self.stats.get('cache_hits'):
+            print(f"Read from extraction cache: {self.stats['cache_hits']}")
+        if self.stats.get('unrecognized_format'):
+            print(f"Unrecognized format (every extractor tried): {self.stats['unrecognized_format']}")
+        if self.stats.get('format_misread'):
+            print(f"Sniffed format didn't extract (others tried): {self.stats['format_misread']}")
         
         json_only = self.stats.get('json_only', 0)
         png_count = self.stats['success'] - json_only
@@ -853,6 +2791,37 @@ class BackyardToTavernConverter:
         print("\nConversion complete!")
 
 
+# Per-process converter used by convert_batch_parallel workers
+_batch_worker = None
+
+
+def _init_batch_worker(debug, verbose, db_path, snapshot=None, cache=None):
+    """Set up the converter (and database connection and cache) owned by a worker process"""
+    global _batch_worker
+    _batch_worker = BackyardToTavernConverter(debug=debug, verbose=verbose)
+    if db_path:
+        _batch_worker.open_database(db_path, snapshot)
+    if cache:
+        _batch_worker.open_cache(*cache)
+
+
+def _run_batch_worker(task):
+    """Convert one batch entry in a worker, returning its result and counters"""
+    worker = _batch_worker
+    worker.stats = worker.new_stats()
+    worker.failed_files = []
+    success, mark, fingerprint = worker.run_batch_task(task)
+    return success, mark, fingerprint, worker.stats, worker.failed_files
+
+
+def _run_batch_worker_chunk(tasks):
+    """Convert a chunk of batch entries in a worker, one result per entry"""
+    results = [_run_batch_worker(task) for task in tasks]
+    # Workers are never closed, so record cache use as they go
+    _batch_worker.flush_cache()
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Convert BackyardAI character cards to TavernAI format (Optimized)',
@@ -862,43 +2831,146 @@ Examples:
   Convert single file:
     %(prog)s "character.png"
     
+  Convert a folder of cards (and its subfolders) into converted_cards:
+    %(prog)s "exports/" "more/*.png"
+    
   Convert from database:
     %(prog)s --database
     
   Convert from custom database:
     %(prog)s --database "path/to/db.sqlite"
     
+  Convert from database using 4 worker processes:
+    %(prog)s --database --jobs 4
+    
+  Export only characters changed since the previous run (e.g. nightly):
+    %(prog)s --database --since auto
+    
+  Export a few characters by name, leaving out their drafts:
+    %(prog)s --database --include "Luna*" --include "Bob" --exclude "*draft*"
+    
+  Split a big library across 3 machines (run 1/3, 2/3 and 3/3, one per machine):
+    %(prog)s --database --shard 1/3
+    
+  Retry only the characters that failed last time:
+    %(prog)s --database --retry-failed
+    
+  Convert a database copied from Windows, with its images folder alongside:
+    %(prog)s --database db.sqlite --path-map "C:\\Users\\me\\AppData\\Roaming\\faraday=."
+    
+  Keep converting new and edited characters as BackyardAI saves them:
+    %(prog)s --database --snapshot ro --watch
+    
+  Export from a private copy while BackyardAI keeps running:
+    %(prog)s --database --snapshot memory
+    
   Convert with debug output:
     %(prog)s --database --debug
     
 Note: Both PNG and JSON files are always generated for each character.
+Database runs keep a manifest in the output directory and skip characters
+that haven't changed since they were last converted (use --force to redo them).
         """
     )
     
-    parser.add_argument('input_file', nargs='?', help='Single PNG file to convert')
+    parser.add_argument('input_files', nargs='*', metavar='INPUT',
+                       help='PNG files, glob patterns or directories (searched recursively) to convert')
     parser.add_argument('--database', '-d', nargs='?', const='default', 
                        help='Convert all from BackyardAI database')
     parser.add_argument('--output-dir', '-o', default='converted_cards',
                        help='Output directory (default: converted_cards)')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                       help='Worker processes for --database mode (default: 1, 0 = one per CPU)')
+    parser.add_argument('--io-threads', type=int, default=2, metavar='N',
+                       help='Reader and writer threads (N of each) around conversion in a single job; '
+                            '0 converts entries one at a time (default: 2)')
+    parser.add_argument('--inflight-mb', type=int, default=INFLIGHT_BYTES // (1024 * 1024), metavar='MB',
+                       help='Memory budget for entries between the read, convert and write stages (default: 64)')
+    parser.add_argument('--latest-only', action='store_true',
+                       help='Only export the newest version of each character')
+    parser.add_argument('--include', action='append', default=[], metavar='PATTERN',
+                       help='With --database, only export characters whose name or display name matches '
+                            '(* and ? wildcards, case-insensitive; repeatable)')
+    parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                       help='With --database, skip characters whose name or display name matches (repeatable)')
+    parser.add_argument('--ids', action='append', default=[], metavar='ID[,ID...]',
+                       help='With --database, only export these character or version ids (repeatable)')
+    parser.add_argument('--group', action='append', default=[], metavar='PATTERN',
+                       help='With --database, only export characters in a chat group whose name matches (repeatable)')
+    parser.add_argument('--limit', type=parse_limit, metavar='N',
+                       help='With --database, stop after N characters (handy for trying options out)')
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                       help='With --database, export only the K-th of N disjoint parts of the library')
+    parser.add_argument('--shard-balance', choices=('hash', 'cost'), default='hash',
+                       help='Split shards by a hash of the version id (default), or by estimated work '
+                            '(persona length plus image size; needs identical data on every machine)')
+    parser.add_argument('--since', type=parse_since, metavar='WHEN',
+                       help="Only export versions changed after WHEN (ISO date, epoch ms, or 'auto' "
+                            "for everything changed since the last run into the output directory)")
+    parser.add_argument('--force', action='store_true',
+                       help='Reconvert characters the output directory manifest marks as unchanged')
+    parser.add_argument('--retry-failed', action='store_true',
+                       help='Only reconvert characters that failed in a previous run')
+    parser.add_argument('--snapshot', choices=SNAPSHOT_MODES, metavar='MODE',
+                       help='Read the live database without blocking the app: ro (read-only), '
+                            'immutable (no locking, app must be closed), or memory/file (private copy)')
+    parser.add_argument('--watch', action='store_true',
+                       help='Keep running and convert characters as they are added or edited')
+    parser.add_argument('--poll-interval', type=float, default=2.0, metavar='SECONDS',
+                       help='How often --watch checks the database for changes (default: 2)')
+    parser.add_argument('--debounce', type=float, default=1.0, metavar='SECONDS',
+                       help='How long changes must settle before --watch converts them (default: 1)')
+    parser.add_argument('--no-stats', action='store_true',
+                       help='Skip the database statistics shown before a batch run')
+    parser.add_argument('--path-map', type=parse_path_map, action='append', default=[], metavar='OLD=NEW',
+                       help='Read image paths stored under OLD from NEW instead (repeatable)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Extract every file from scratch instead of using the extraction cache '
+                            '(a single file is never cached)')
+    parser.add_argument('--cache-file', metavar='PATH',
+                       help=f'Location of the extraction cache (default: {default_cache_path()})')
+    parser.add_argument('--cache-mb', type=int, default=CACHE_BYTES // (1024 * 1024), metavar='MB',
+                       help='Size the extraction cache is trimmed to, least recently used first (default: 64)')
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
     
     args = parser.parse_args()
+    if args.watch and not args.database:
+        parser.error("--watch requires --database")
+    if args.shard and not args.database:
+        parser.error("--shard requires --database")
+    if args.watch and args.snapshot in ('immutable', 'memory', 'file'):
+        parser.error(f"--watch needs to see the database change, which --snapshot {args.snapshot} prevents")
+    
+    # A lone file argument keeps the original single file behavior
+    single_file = (len(args.input_files) == 1 and not os.path.isdir(args.input_files[0].strip('"'))
+                   and not is_glob_pattern(args.input_files[0].strip('"')))
+    
+    # How batches run, in any batch mode
+    batch_options = {
+        'jobs': args.jobs if args.jobs > 0 else (os.cpu_count() or 1),
+        'io_threads': args.io_threads,
+        'inflight_bytes': args.inflight_mb * 1024 * 1024,
+    }
     
     # Create converter
     converter = BackyardToTavernConverter(debug=args.debug, verbose=args.verbose)
+    converter.path_maps = args.path_map
     
     if args.database:
         # Database batch mode
         db_path = None if args.database == 'default' else args.database
         
-        if converter.open_database(db_path):
+        if converter.open_database(db_path, args.snapshot):
+            if not args.no_cache:
+                # Only rows whose image the lookup misses are read from PNG files
+                converter.open_cache(args.cache_file, args.cache_mb * 1024 * 1024)
             print("=" * 60)
             print("BackyardAI Database Batch Conversion")
             print("=" * 60)
             
             # Show database statistics
-            db_stats = converter.get_database_stats()
+            db_stats = None if args.no_stats else converter.get_database_stats()
             if db_stats:
                 print("\nDatabase Statistics:")
                 print(f"  Total character configs: {db_stats['total_configs']}")
@@ -908,14 +2980,46 @@ Note: Both PNG and JSON files are always generated for each character.
                 print(f"  Expected total to export: {db_stats['chars_with_images'] + db_stats['chars_without_images']}")
                 print()
             
-            files = converter.get_character_files_from_db()
-            if files:
-                print(f"Found {len(files)} character files in database")
-                converter.convert_batch(files, args.output_dir)
+            shard = None
+            if args.shard:
+                shard = ShardPlan(*args.shard)
+                if args.shard_balance == 'cost':
+                    shard.balance(converter.shard_costs())
+                print(f"Exporting shard {shard.index} of {shard.count} ({args.shard_balance} partitioning)")
+            
+            manifest = ConversionManifest.load(args.output_dir, shard.label if shard else None)
+            filters = {
+                'latest_only': args.latest_only,
+                'include': args.include,
+                'exclude': args.exclude,
+                'ids': [version_id for value in args.ids for version_id in value.split(',') if version_id],
+                'groups': args.group,
+                'limit': args.limit,
+            }
+            if args.since == 'auto':
+                filters['since'] = manifest.watermarks.get(ConversionManifest.watermark_scope(filters))
             else:
+                filters['since'] = args.since
+            since = filters['since']
+            if since is not None:
+                print(f"Only exporting characters changed since {format_timestamp(since)}")
+            
+            found = converter.export_database(args.output_dir, manifest, filters, shard, force=args.force,
+                                              retry_failed=args.retry_failed, **batch_options)
+            if not found and since is not None:
+                print("No characters changed since the last export")
+            elif not found:
                 print("No character files found in database")
             
+            if args.watch:
+                converter.watch_database(args.output_dir, manifest, filters, poll_interval=args.poll_interval,
+                                         debounce=args.debounce, shard=shard, **batch_options)
+            
+            converter.close_cache()
             converter.close_database()
+            if shard:
+                converter.write_summary(os.path.join(args.output_dir, f".conversion_summary.shard-{shard.label}.json"),
+                                        shard=shard.label, partitioning=args.shard_balance)
             converter.print_summary()
         else:
             print("Failed to open database")
@@ -923,12 +3027,31 @@ Note: Both PNG and JSON files are always generated for each character.
                 print(f"Default location: {converter.get_default_db_path()}")
                 print("Use --database with a path to specify a different location")
         
-    elif args.input_file:
+    elif args.input_files and not single_file:
+        # Multiple files: one converter and database connection for all of them
+        files = list(expand_input_paths(args.input_files))
+        
+        # Try with database support for better extraction
+        converter.open_database(snapshot=args.snapshot)
+        if not args.no_cache:
+            converter.open_cache(args.cache_file, args.cache_mb * 1024 * 1024)
+        
+        if files:
+            converter.convert_batch(files, args.output_dir, force=args.force, retry_failed=args.retry_failed,
+                                    **batch_options)
+        else:
+            print("No PNG files found")
+        
+        converter.close_cache()
+        converter.close_database()
+        converter.print_summary()
+        
+    elif args.input_files:
         # Single file mode
-        input_file = args.input_file.strip('"')
+        input_file = args.input_files[0].strip('"')
         
         # Try with database support for better extraction
-        converter.open_database()
+        converter.open_database(snapshot=args.snapshot)
         
         print(f"Converting: {os.path.basename(input_file)}")
         success = converter.convert_file(input_file, use_database=converter.db_cursor is not None)
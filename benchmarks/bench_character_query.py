@@ -0,0 +1,113 @@
+# Benchmark for the --database batch query against a chat-heavy synthetic library
+# Times the previous query (every Chat row joined, then collapsed with GROUP BY)
+# against get_character_files_from_db, which resolves the newest chat per version.
+#
+#   python benchmarks/bench_character_query.py [--characters N] [--chats N] [--text-size BYTES]
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backyard_to_tavern import BackyardToTavernConverter
+
+SCHEMA = """
+CREATE TABLE CharacterConfig (id TEXT PRIMARY KEY, isUserControlled BOOLEAN, isDefaultUserCharacter BOOLEAN);
+CREATE TABLE CharacterConfigVersion (id TEXT PRIMARY KEY, name TEXT, displayName TEXT, persona TEXT,
+                                     characterConfigId TEXT, createdAt DATETIME, updatedAt DATETIME);
+CREATE TABLE AppImage (id TEXT PRIMARY KEY, imageUrl TEXT);
+CREATE TABLE _AppImageToCharacterConfigVersion (A TEXT, B TEXT);
+CREATE UNIQUE INDEX _AppImageToCharacterConfigVersion_AB_unique ON _AppImageToCharacterConfigVersion(A, B);
+CREATE INDEX _AppImageToCharacterConfigVersion_B_index ON _AppImageToCharacterConfigVersion(B);
+CREATE TABLE GroupConfig (id TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE _CharacterConfigToGroupConfig (A TEXT, B TEXT);
+CREATE UNIQUE INDEX _CharacterConfigToGroupConfig_AB_unique ON _CharacterConfigToGroupConfig(A, B);
+CREATE INDEX _CharacterConfigToGroupConfig_B_index ON _CharacterConfigToGroupConfig(B);
+CREATE TABLE Chat (id TEXT PRIMARY KEY, groupConfigId TEXT, greetingDialogue TEXT, customDialogue TEXT,
+                   createdAt DATETIME);
+"""
+
+LEGACY_QUERY = """
+SELECT DISTINCT
+    ccv.id as version_id, ccv.name, ccv.displayName, ccv.persona, ai.imageUrl,
+    MAX(c.greetingDialogue) as greetingDialogue,
+    MAX(c.customDialogue) as customDialogue
+FROM CharacterConfig cc
+JOIN CharacterConfigVersion ccv ON cc.id = ccv.characterConfigId
+LEFT JOIN _AppImageToCharacterConfigVersion aitc ON ccv.id = aitc.B
+LEFT JOIN AppImage ai ON aitc.A = ai.id
+LEFT JOIN _CharacterConfigToGroupConfig ccgc ON cc.id = ccgc.A
+LEFT JOIN GroupConfig gc ON ccgc.B = gc.id
+LEFT JOIN Chat c ON gc.id = c.groupConfigId
+WHERE cc.isUserControlled = 0
+AND cc.isDefaultUserCharacter = 0
+GROUP BY ccv.id, ccv.name, ccv.displayName, ccv.persona, ai.imageUrl
+ORDER BY ccv.name
+"""
+
+
+def build_database(path, characters, chats, text_size):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    text = 'x' * text_size
+    for i in range(characters):
+        conn.execute("INSERT INTO CharacterConfig VALUES (?, 0, 0)", (f"cc{i}",))
+        conn.execute("INSERT INTO CharacterConfigVersion VALUES (?, ?, NULL, ?, ?, ?, ?)",
+                     (f"v{i}", f"Character {i}", text, f"cc{i}", i, i))
+        conn.execute("INSERT INTO AppImage VALUES (?, ?)", (f"ai{i}", f"/nonexistent/images/{i}.png"))
+        conn.execute("INSERT INTO _AppImageToCharacterConfigVersion VALUES (?, ?)", (f"ai{i}", f"v{i}"))
+        conn.execute("INSERT INTO GroupConfig VALUES (?, ?)", (f"g{i}", f"Group {i}"))
+        conn.execute("INSERT INTO _CharacterConfigToGroupConfig VALUES (?, ?)", (f"cc{i}", f"g{i}"))
+        conn.executemany("INSERT INTO Chat VALUES (?, ?, ?, ?, ?)",
+                         ((f"c{i}_{k}", f"g{i}", f"{k} {text}", f"{k} {text}", k) for k in range(chats)))
+    conn.commit()
+    conn.close()
+
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the --database batch query on a chat-heavy library")
+    parser.add_argument('--characters', type=int, default=300)
+    parser.add_argument('--chats', type=int, default=300, help='Chats per character')
+    parser.add_argument('--text-size', type=int, default=512, help='Size of persona/greeting/dialogue text')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'db.sqlite')
+        print(f"Building {args.characters} characters x {args.chats} chats ({args.text_size} byte texts)...")
+        build_database(db_path, args.characters, args.chats, args.text_size)
+        
+        for chat_index in (False, True):
+            if chat_index:
+                conn = sqlite3.connect(db_path)
+                conn.execute("CREATE INDEX Chat_groupConfigId_createdAt ON Chat(groupConfigId, createdAt)")
+                conn.commit()
+                conn.close()
+            
+            converter = BackyardToTavernConverter()
+            converter.open_database(db_path)
+            legacy_time, legacy_rows = timed(lambda: converter.db_cursor.execute(LEGACY_QUERY).fetchall())
+            new_time, new_rows = timed(converter.get_character_files_from_db)
+            converter.close_database()
+            
+            assert len(legacy_rows) == len(new_rows)
+            label = "with Chat(groupConfigId, createdAt) index" if chat_index else "without Chat index"
+            print(f"  {label}:")
+            print(f"    legacy GROUP BY query:       {legacy_time:8.3f}s")
+            print(f"    get_character_files_from_db: {new_time:8.3f}s ({legacy_time / new_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# Benchmark for the base64 payload scanner used by the EXIF and export extractors
+# Compares find_base64_payload/clean_base64_payload against the byte-by-byte
+# cleaning loop and regex they replaced, on synthetic payloads of 1 MB and up.
+#
+#   python benchmarks/bench_payload_scan.py
+
+import base64
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backyard_to_tavern import find_base64_payload, clean_base64_payload
+
+
+def make_exif_payload(size):
+    """Build an EXIF-style field: ASCII marker, base64 JSON, then a control byte and trailing data"""
+    persona = 'x' * size
+    payload = base64.b64encode(json.dumps({'character': {'aiName': 'Bench', 'aiPersona': persona}}).encode())
+    return b'\x00\x07ASCII\x00\x00\x00' + payload + b'\x00\x01\x02junk after the field'
+
+
+def legacy_exif_clean(data):
+    """The previous per-byte cleaning loop from extract_exif_format"""
+    start_pos = data.find(b'ASCII') + 5
+    while start_pos < len(data) and data[start_pos:start_pos+1] in b' \x00\n\r\t':
+        start_pos += 1
+    cleaned = b''
+    for byte in data[start_pos:]:
+        if chr(byte) in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=':
+            cleaned += bytes([byte])
+        elif cleaned and cleaned[-1:] != b'=' and byte in (0, 1, 2, 3, 4):
+            break
+    return cleaned
+
+
+def legacy_export_clean(data):
+    """The previous regex cleaning from extract_backyard_export"""
+    return re.sub(rb'[^a-zA-Z0-9+/=]', b'', data)
+
+
+def scan_exif(data):
+    bounds = find_base64_payload(data, data.find(b'ASCII') + 5, stop_at_control=True)
+    return clean_base64_payload(data, *bounds)
+
+
+def timed(func, data, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print(f"{'payload':>10}  {'legacy EXIF loop':>17}  {'legacy regex':>13}  {'scanner EXIF':>13}  {'scanner export':>15}")
+    for size in (64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024):
+        data = make_exif_payload(size)
+        
+        # The quadratic loop is only run (and cross-checked) on the smaller payloads
+        if size <= 256 * 1024:
+            field = data[:data.index(b'\x00\x01\x02')]
+            assert scan_exif(data) == clean_base64_payload(legacy_exif_clean(field))
+            legacy_loop = f"{timed(legacy_exif_clean, data, 1):16.3f}s"
+        else:
+            legacy_loop = f"{'(skipped)':>17}"
+        print(f"{len(data) / 1024 / 1024:9.2f}M  {legacy_loop}  {timed(legacy_export_clean, data):12.4f}s"
+              f"  {timed(scan_exif, data):12.4f}s  {timed(clean_base64_payload, data):14.4f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Benchmark for the memory held by per-character records in a large batch
+# Builds N database rows and extracted cards both as the plain dicts used before
+# and as CharacterRow/CharacterCard, and reports the traced allocation size of each.
+#
+#   python benchmarks/bench_record_memory.py [--characters N]
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backyard_to_tavern import CharacterRow, CharacterCard
+
+
+def row_fields(i):
+    """Field values of a synthetic row; text fields are shared, so mostly the containers are measured"""
+    return (f"version-{i}", "Character", "Display Name", "Persona text", "Hello!", "Example dialogue",
+            True, "/images/character.png", 1700000000000 + i)
+
+
+def build_dict_rows(n):
+    rows = []
+    for i in range(n):
+        version_id, name, display_name, persona, greeting, dialogue, has_image, path, changed = row_fields(i)
+        rows.append({
+            'version_id': version_id,
+            'name': name,
+            'display_name': display_name,
+            'persona': persona,
+            'greeting': greeting,
+            'custom_dialogue': dialogue,
+            'has_image': has_image,
+            'path': path,
+            'changed_at': changed,
+        })
+    return rows
+
+
+def build_slotted_rows(n):
+    return [CharacterRow(*row_fields(i)) for i in range(n)]
+
+
+def build_dict_cards(n):
+    return [{
+        'name': "Character",
+        'display_name': "Display Name",
+        'description': "Persona text",
+        'personality': '',
+        'scenario': '',
+        'first_mes': "Hello!",
+        'mes_example': "Example dialogue",
+    } for _ in range(n)]
+
+
+def build_slotted_cards(n):
+    return [CharacterCard("Character", "Display Name", "Persona text", '', '', "Hello!", "Example dialogue")
+            for _ in range(n)]
+
+
+def measure(build, n):
+    """Return the bytes still allocated by build(n) once it returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = build(n)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare memory of dict and slotted character records')
+    parser.add_argument('--characters', type=int, default=50000)
+    args = parser.parse_args()
+    n = args.characters
+
+    print(f"{n} characters")
+    for label, build_dicts, build_slotted in (('Database rows', build_dict_rows, build_slotted_rows),
+                                              ('Extracted cards', build_dict_cards, build_slotted_cards)):
+        dict_bytes = measure(build_dicts, n)
+        slotted_bytes = measure(build_slotted, n)
+        print(f"{label}:")
+        print(f"  dict:    {dict_bytes / 1e6:8.2f} MB ({dict_bytes / n:6.0f} bytes/record)")
+        print(f"  slotted: {slotted_bytes / 1e6:8.2f} MB ({slotted_bytes / n:6.0f} bytes/record)"
+              f"  {dict_bytes / slotted_bytes:.1f}x smaller")
+
+
+if __name__ == '__main__':
+    main()